@@ -0,0 +1,174 @@
+"""
+Локальный архив обработанных сообщений (SQLite с полнотекстовым индексом FTS5)
+Обработчик добавляет сообщения в буфер, а запись в базу идет пачками
+в отдельном потоке, поэтому архив не задерживает event loop.
+Поиск по архиву и повторная проверка новых ключевых слов - scripts/archive_search.py
+"""
+
+import asyncio
+import pathlib
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+from log import get_logger
+
+log = get_logger("archive")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    chat_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    date REAL NOT NULL,
+    channel TEXT NOT NULL,
+    text TEXT NOT NULL,
+    UNIQUE (chat_id, message_id)
+);
+CREATE INDEX IF NOT EXISTS messages_date ON messages (date);
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    text, content='messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_au AFTER UPDATE OF text ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    INSERT INTO messages_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+# Отредактированное сообщение заменяет прежнюю версию
+_UPSERT = """
+INSERT INTO messages (chat_id, message_id, date, channel, text) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (chat_id, message_id) DO UPDATE SET text = excluded.text
+WHERE messages.text != excluded.text
+"""
+
+
+class ArchivedMessage(NamedTuple):
+    chat_id: int
+    message_id: int
+    date: float         # Unix time
+    channel: str        # Канал, как он указан в конфиге
+    text: str
+
+
+def connect(path, readonly: bool = False) -> sqlite3.Connection:
+    """Открывает базу архива (создает таблицы, если их нет)"""
+    if readonly:
+        conn = sqlite3.connect(f"file:{pathlib.Path(path)}?mode=ro", uri=True)
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+    conn = sqlite3.connect(str(path), check_same_thread=False)
+    conn.execute("PRAGMA busy_timeout=5000")
+    # WAL: поиск не мешает записи, а в режиме нескольких процессов воркеры пишут в одну базу
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+class MessageArchive:
+    """
+    Буфер сообщений и их запись в базу пачками по batch_size
+    (или раз в flush_interval секунд, если сообщений мало)
+    """
+
+    def __init__(self, path, batch_size: int = 500, flush_interval: float = 2.0):
+        self.path = pathlib.Path(path)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._buffer: List[Tuple[int, int, float, str, str]] = []
+        self._conn: Optional[sqlite3.Connection] = None
+        # Один поток: соединение SQLite используется только из него
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="archive")
+        self._pending_writes: set = set()
+        self.written = 0
+
+    def open(self):
+        self._conn = connect(self.path)
+
+    def add(self, chat_id: int, message_id: int, date, channel: str, text: str):
+        """Добавляет сообщение в буфер (без обращения к диску)"""
+        if not text:
+            return
+        timestamp = date.timestamp() if date is not None else time.time()
+        self._buffer.append((chat_id, message_id, timestamp, channel, text))
+        if len(self._buffer) >= self.batch_size:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        if not self._buffer or self._conn is None:
+            return
+        batch, self._buffer = self._buffer, []
+        future = asyncio.get_running_loop().run_in_executor(self._executor, self._write, batch)
+        self._pending_writes.add(future)
+        future.add_done_callback(self._write_done)
+
+    def _write_done(self, future):
+        self._pending_writes.discard(future)
+        if not future.cancelled() and future.exception() is not None:
+            log.warning("Не удалось записать сообщения в архив", extra={"error": str(future.exception())})
+
+    def _write(self, batch):
+        with self._conn:
+            self._conn.executemany(_UPSERT, batch)
+        self.written += len(batch)
+
+    async def autoflush(self):
+        """Периодически записывает буфер, чтобы сообщения не ждали полной пачки"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self._schedule_flush()
+
+    async def close(self):
+        """Записывает остаток буфера и закрывает базу"""
+        self._schedule_flush()
+        if self._pending_writes:
+            await asyncio.gather(*self._pending_writes, return_exceptions=True)
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            await asyncio.get_running_loop().run_in_executor(self._executor, conn.close)
+        self._executor.shutdown(wait=True)
+
+
+def search(conn: sqlite3.Connection, query: str, since: float = None, channel: str = None,
+           limit: int = 20) -> List[Tuple[ArchivedMessage, str]]:
+    """
+    Полнотекстовый поиск (синтаксис FTS5: слова, "фразы", префикс*, AND/OR/NOT)
+    Возвращает (сообщение, фрагмент с выделенными совпадениями), новые - первыми
+    """
+    sql = ("SELECT m.chat_id, m.message_id, m.date, m.channel, m.text, "
+           "snippet(messages_fts, 0, '[', ']', '…', 12) "
+           "FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid "
+           "WHERE messages_fts MATCH ?")
+    params: list = [query]
+    if since is not None:
+        sql += " AND m.date >= ?"
+        params.append(since)
+    if channel is not None:
+        sql += " AND m.channel = ?"
+        params.append(channel)
+    sql += " ORDER BY m.date DESC LIMIT ?"
+    params.append(limit)
+    return [(ArchivedMessage(*row[:5]), row[5]) for row in conn.execute(sql, params)]
+
+
+def iter_messages(conn: sqlite3.Connection, since: float = None, channel: str = None) -> Iterator[ArchivedMessage]:
+    """Все сообщения архива по порядку (для повторной проверки ключевых слов)"""
+    sql = "SELECT chat_id, message_id, date, channel, text FROM messages WHERE 1"
+    params: list = []
+    if since is not None:
+        sql += " AND date >= ?"
+        params.append(since)
+    if channel is not None:
+        sql += " AND channel = ?"
+        params.append(channel)
+    sql += " ORDER BY date"
+    for row in conn.execute(sql, params):
+        yield ArchivedMessage(*row)
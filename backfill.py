@@ -0,0 +1,164 @@
+"""
+Догрузка сообщений, пропущенных во время перезапуска
+Для каждого канала сохраняется ID последнего обработанного сообщения,
+а при запуске все сообщения после него прогоняются через тот же обработчик
+"""
+
+import asyncio
+import json
+import os
+import pathlib
+import time
+from typing import Awaitable, Callable, Dict, Iterable
+
+from log import get_logger
+
+log = get_logger("backfill")
+
+
+class MessageState:
+    """
+    ID последнего обработанного сообщения по каждому каналу
+    Хранится в JSON-файле, запись выполняется атомарно (через временный файл)
+    """
+
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self.last_ids: Dict[int, int] = {}
+        # ID первого сообщения, полученного в реальном времени после запуска
+        # (догрузка останавливается на нем, чтобы не обработать сообщение дважды)
+        self.live_start: Dict[int, int] = {}
+        # Начало еще не догруженного промежутка по каждому каналу: снимок last_ids,
+        # сделанный до приема обновлений. Пока догрузка не закончена, на диск
+        # сохраняется он, а не last_ids, чтобы после падения догрузить остаток
+        self.gaps: Dict[int, int] = {}
+        self._dirty = False
+
+    def load(self):
+        """Загружает сохраненное состояние (если файл есть)"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            log.warning("Не удалось прочитать состояние, начинаем с текущих сообщений",
+                        extra={"path": str(self.path), "error": str(e)})
+            return
+        self.last_ids = {int(chat_id): int(message_id) for chat_id, message_id in data.items()}
+
+    def save(self):
+        """Сохраняет состояние, если оно изменилось"""
+        if not self._dirty:
+            return
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({str(chat_id): self.gaps.get(chat_id, message_id)
+                       for chat_id, message_id in self.last_ids.items()}, f)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+    def update(self, chat_id: int, message_id: int, live: bool = False):
+        """Запоминает обработанное сообщение"""
+        if live and chat_id not in self.live_start:
+            self.live_start[chat_id] = message_id
+        if message_id > self.last_ids.get(chat_id, 0):
+            self.last_ids[chat_id] = message_id
+            self._dirty = True
+
+    def mark_gaps(self):
+        """
+        Запоминает, с какого сообщения догружать каждый канал
+        Вызывается до приема обновлений: живые сообщения сдвигают last_ids
+        раньше, чем догрузка успевает его прочитать
+        """
+        for chat_id, message_id in self.last_ids.items():
+            # Промежуток, догрузка которого не закончилась, остается прежним
+            self.gaps.setdefault(chat_id, message_id)
+
+    def backfilled(self, chat_id: int, message_id: int = None):
+        """Догрузка канала дошла до сообщения message_id (None - закончена)"""
+        if message_id is None:
+            if self.gaps.pop(chat_id, None) is not None:
+                self._dirty = True
+        elif message_id > self.gaps.get(chat_id, message_id):
+            self.gaps[chat_id] = message_id
+            self._dirty = True
+
+    def reset_live(self):
+        """
+        Соединение потеряно: следующая догрузка остановится на первом сообщении,
+        полученном после переподключения (начало догрузки задает mark_gaps)
+        """
+        self.live_start.clear()
+
+    async def autosave(self, interval: float = 10.0):
+        """Периодически сохраняет состояние на диск"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.save()
+            except OSError as e:
+                log.warning("Не удалось сохранить состояние", extra={"path": str(self.path), "error": str(e)})
+
+
+class BackfillEvent:
+    """
+    Обертка над сообщением из истории с тем же интерфейсом,
+    что и у события NewMessage, для передачи в обработчик
+    """
+
+    def __init__(self, message):
+        self.message = message
+        self.chat_id = message.chat_id
+
+    async def get_chat(self):
+        return await self.message.get_chat()
+
+
+async def backfill_channels(client, chat_ids: Iterable[int], state: MessageState,
+                            process: Callable[[BackfillEvent], Awaitable[None]],
+                            concurrency: int = 4, limit: int = None):
+    """
+    Догружает сообщения, пропущенные с момента последнего запуска
+    (после state.gaps, см. MessageState.mark_gaps)
+    Каналы обрабатываются параллельно (не больше concurrency одновременно),
+    сообщения внутри канала - по порядку
+    """
+    chat_ids = list(chat_ids)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    started = time.monotonic()
+
+    async def backfill_one(chat_id: int) -> int:
+        min_id = state.gaps.get(chat_id)
+        if not min_id:
+            # Канал еще не обрабатывался или уже догружен - догружать нечего
+            return 0
+        count = 0
+        async with semaphore:
+            # reverse=True - от старых к новым; страницы по 100 сообщений (максимум API)
+            async for message in client.iter_messages(chat_id, min_id=min_id, reverse=True,
+                                                      limit=limit, wait_time=0):
+                live_start = state.live_start.get(chat_id)
+                if live_start is not None and message.id >= live_start:
+                    break
+                await process(BackfillEvent(message))
+                state.backfilled(chat_id, message.id)
+                count += 1
+        state.backfilled(chat_id)
+        return count
+
+    results = await asyncio.gather(*(backfill_one(chat_id) for chat_id in chat_ids),
+                                   return_exceptions=True)
+    total = 0
+    for chat_id, result in zip(chat_ids, results):
+        if isinstance(result, Exception):
+            log.warning("Не удалось догрузить сообщения канала", extra={"chat_id": chat_id, "error": str(result)})
+        else:
+            total += result
+
+    elapsed = time.monotonic() - started
+    rate = total / elapsed if elapsed > 0 else 0.0
+    log.info("Догружены пропущенные сообщения",
+             extra={"messages": total, "seconds": round(elapsed, 1), "rate": round(rate)})
+    return total
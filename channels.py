@@ -0,0 +1,117 @@
+"""
+Список каналов для мониторинга и маршрутизация сообщений по chat_id
+Один клиент и один обработчик обслуживают все каналы, а нужный набор
+ключевых слов выбирается поиском в словаре по ID чата
+"""
+
+from typing import Dict, List, NamedTuple, Optional
+
+import config
+from matcher import KeywordMatcher, WordMatcher
+from normalize import Normalizer
+from rules import RuleSet
+from stemmer import stem
+
+# Нормализаторы кэшируют таблицу символов, поэтому создаются один раз
+_normalizers: Dict[bool, Normalizer] = {}
+
+
+class ChannelRoute(NamedTuple):
+    """Канал и скомпилированный набор ключевых слов для него"""
+    name: str
+    matcher: KeywordMatcher
+
+
+def compile_keywords(keywords: List[str]) -> KeywordMatcher:
+    """
+    Компилирует список ключевых слов с учетом настроек
+    config.CASE_INSENSITIVE, config.NORMALIZE_TEXT и config.MATCH_MODE
+    Если заданы правила config.RULES, возвращает RuleSet: ключевые слова
+    становятся простыми правилами, а фразы всех правил ищутся за один проход
+    """
+    rules = getattr(config, "RULES", None)
+    if rules:
+        return RuleSet(keywords, rules, compile_phrases=compile_phrases)
+    return compile_phrases(keywords)
+
+
+def compile_phrases(keywords: List[str]) -> KeywordMatcher:
+    """Компилирует список фраз в matcher согласно config.MATCH_MODE"""
+    normalizer = None
+    if getattr(config, "NORMALIZE_TEXT", False):
+        casefold = config.CASE_INSENSITIVE
+        normalizer = _normalizers.get(casefold)
+        if normalizer is None:
+            normalizer = _normalizers[casefold] = Normalizer(casefold=casefold)
+    mode = getattr(config, "MATCH_MODE", "substring")
+    if mode == "word":
+        return WordMatcher(keywords, case_insensitive=config.CASE_INSENSITIVE, normalizer=normalizer)
+    if mode == "stem":
+        return WordMatcher(keywords, case_insensitive=config.CASE_INSENSITIVE, normalizer=normalizer, stem=stem)
+    if mode != "substring":
+        raise ValueError(f"неизвестный MATCH_MODE: {mode!r}")
+    return KeywordMatcher(keywords, case_insensitive=config.CASE_INSENSITIVE, normalizer=normalizer)
+
+
+def load_channels(channel_name: str = None) -> Dict[str, Optional[List[str]]]:
+    """
+    Собирает список каналов из CHANNEL_NAME (через запятую) и config.CHANNELS
+    Возвращает словарь: имя канала -> список ключевых слов (None - общий KEYWORDS)
+    """
+    channels: Dict[str, Optional[List[str]]] = {}
+    for name in (channel_name or "").split(","):
+        name = name.strip()
+        if name and name != "your_channel_name_here":
+            channels[name] = None
+    for name, keywords in getattr(config, "CHANNELS", {}).items():
+        name = str(name).strip()
+        if name:
+            channels[name] = list(keywords) if keywords is not None else None
+    return channels
+
+
+def build_routes(peer_ids: Dict[str, int], channels: Dict[str, Optional[List[str]]],
+                 default_matcher: KeywordMatcher) -> Dict[int, ChannelRoute]:
+    """
+    Строит таблицу маршрутов: chat_id -> ChannelRoute
+    Каналы с одинаковым списком ключевых слов используют один общий автомат
+    """
+    matchers: Dict[tuple, KeywordMatcher] = {}
+    routes: Dict[int, ChannelRoute] = {}
+    for name, peer_id in peer_ids.items():
+        keywords = channels.get(name)
+        if keywords is None:
+            matcher = default_matcher
+        else:
+            key = tuple(keywords)
+            matcher = matchers.get(key)
+            if matcher is None:
+                matcher = compile_keywords(keywords)
+                matchers[key] = matcher
+        routes[peer_id] = ChannelRoute(name, matcher)
+    return routes
+
+
+class RouteTable:
+    """
+    Таблица маршрутов chat_id -> ChannelRoute
+    При перезагрузке конфигурации заменяется целиком одним присваиванием,
+    поэтому обработчик всегда видит либо старую, либо новую таблицу
+    """
+
+    def __init__(self, routes: Dict[int, ChannelRoute] = None):
+        self.routes: Dict[int, ChannelRoute] = routes or {}
+
+    def __len__(self) -> int:
+        return len(self.routes)
+
+    def __iter__(self):
+        return iter(self.routes)
+
+    def get(self, chat_id: int) -> Optional[ChannelRoute]:
+        return self.routes.get(chat_id)
+
+    def swap(self, routes: Dict[int, ChannelRoute]) -> Dict[int, ChannelRoute]:
+        """Подменяет таблицу и возвращает предыдущую"""
+        old, self.routes = self.routes, routes
+        return old
@@ -10,8 +10,150 @@ KEYWORDS = [
 ]
 
 # Имя или username канала для мониторинга (например: "channel_name" или "https://t.me/channel_name")
+# Можно указать несколько каналов через запятую: "channel_one, @channel_two"
 CHANNEL_NAME = ""
 
+# Каналы и группы со своими наборами ключевых слов
+# Все они обслуживаются одним клиентом и одним обработчиком
+# Значение None означает общий список KEYWORDS
+CHANNELS = {
+    # "@channel_one": None,
+    # "@channel_two": ["ремонт", "перекрытие"],
+}
+
 # Чувствительность к регистру (True = не чувствительно, False = чувствительно)
 CASE_INSENSITIVE = True
 
+# Нормализация текста перед поиском: Unicode NFKC, похожие латинские буквы -> кириллица,
+# ё -> е, удаление невидимых символов и знаков ударения, склейка переносов слов
+NORMALIZE_TEXT = True
+
+# Правила: булевы выражения над фразами (AND, OR, NOT, скобки, "фраза в кавычках")
+# и регулярными выражениями (/шаблон/, с флагом i - без учета регистра)
+# Регулярные выражения применяются к исходному тексту сообщения (без нормализации)
+# severity - важность (low, normal, high, critical), chat - отдельный чат для уведомлений
+# Все фразы всех правил ищутся за один проход по тексту, как и KEYWORDS
+RULES = [
+    # {"name": "Перекрытие трассы", "rule": "шлях AND (закрыт OR ремонт) NOT реклама", "severity": "high"},
+    # {"name": "М-05", "rule": r"/траса\s+м-?0?5/i", "chat": "-1001234567890"},
+]
+
+# Режим поиска ключевых слов:
+# "substring" - вхождение подстроки (как раньше, "шлях" найдется и внутри "шляхетний")
+# "word"      - только целые слова
+# "stem"      - целые слова с учетом окончаний: "шлях" найдет "шляху", "шляхом", "шляхів"
+MATCH_MODE = "substring"
+
+
+# Очередь уведомлений: максимальный размер и число параллельных отправителей
+# Если очередь заполнена, обработчик сообщений ждет освобождения места
+NOTIFY_QUEUE_SIZE = 1000
+NOTIFY_WORKERS = 4
+
+# Дополнительные получатели уведомлений (кроме NOTIFY_CHAT_ID из .env)
+# chat - ID чата, username или "me"; sender - кто отправляет: "bot" (BOT_TOKEN) или "user" (ваш аккаунт)
+DESTINATIONS = {
+    # "ops": {"chat": "-1001234567890", "sender": "bot"},
+    # "me": {"chat": "me", "sender": "user"},
+}
+
+# Маршруты уведомлений: уведомление уходит всем получателям ("to") подошедших маршрутов
+# keywords - найденные ключевые слова или имена правил, channels - каналы (как в CHANNEL_NAME/CHANNELS)
+# Если не подошел ни один маршрут - уведомление уходит в NOTIFY_CHAT_ID ("default")
+NOTIFY_ROUTES = [
+    # {"keywords": ["шлях"], "to": ["default", "ops"]},
+    # {"channels": ["@channel_two"], "to": ["me"]},
+]
+
+# Ограничение скорости отправки (сообщений в секунду) по лимитам Telegram:
+# в один личный чат, в одну группу/канал (20 в минуту), подряд без паузы в один чат,
+# и всего от бота и от аккаунта. Получатели отправляются параллельно, каждый со своим лимитом
+RATE_LIMIT_PRIVATE = 1.0
+RATE_LIMIT_GROUP = 20 / 60
+RATE_LIMIT_BURST = 3
+RATE_LIMIT_BOT = 30
+RATE_LIMIT_USER = 10
+
+# Журнал исходящих уведомлений (outbox.log): уведомление записывается на диск до отправки
+# и при ошибке отправляется повторно (при FloodWait - через указанное Telegram время),
+# поэтому не теряется и не дублируется при сбоях и перезапусках сервиса
+# OUTBOX_MAX_AGE - через сколько секунд неотправленное уведомление удаляется,
+# OUTBOX_MAX_BACKOFF - максимальная пауза между повторами (секунды)
+OUTBOX_ENABLED = True
+OUTBOX_MAX_AGE = 24 * 3600
+OUTBOX_MAX_BACKOFF = 300
+
+# Время жизни кэша информации о каналах (секунды)
+CHAT_CACHE_TTL = 600
+
+# Сколько каналов определять по username одновременно (когда их нет в entity_cache.json)
+RESOLVE_CONCURRENCY = 5
+
+# Режим дайджеста: совпадения собираются и отправляются одним сообщением
+# через DIGEST_WINDOW секунд после первого совпадения или при DIGEST_MAX_ALERTS совпадениях
+DIGEST_MODE = False
+DIGEST_WINDOW = 60
+DIGEST_MAX_ALERTS = 20
+# Отправлять дайджест, как только очередь уведомлений опустела (не дожидаясь DIGEST_WINDOW):
+# в одно сообщение попадают совпадения одного всплеска. Уведомления из очереди забираются
+# быстро, поэтому при редких совпадениях дайджест будет почти из одного совпадения
+DIGEST_FLUSH_ON_IDLE = False
+
+# Догрузка сообщений, пропущенных во время перезапуска
+# BACKFILL_LIMIT - максимум сообщений на канал (None - без ограничения)
+BACKFILL_ENABLED = True
+BACKFILL_CONCURRENCY = 4
+BACKFILL_LIMIT = None
+
+# Переподключение без перезапуска процесса: если соединение с Telegram потеряно, бот
+# переподключается с паузами от RECONNECT_INITIAL_DELAY до RECONNECT_MAX_DELAY секунд
+# (со случайным разбросом), а затем догружает сообщения, пропущенные за время обрыва
+RECONNECT_INITIAL_DELAY = 1
+RECONNECT_MAX_DELAY = 60
+
+# Проверять отредактированные сообщения (уведомление - только если появились новые совпадения)
+# EDIT_TRACK_MAX - для скольких последних сообщений помнить предыдущую версию
+WATCH_EDITS = True
+EDIT_TRACK_MAX = 10000
+
+# Отсев повторов: пересланные и перепощенные копии уже найденного сообщения не уведомляются
+# Помнится не больше DEDUP_MAX_ENTRIES сообщений за последние DEDUP_TTL секунд
+DEDUP_ENABLED = True
+DEDUP_MAX_ENTRIES = 100000
+DEDUP_TTL = 3 * 24 * 3600
+
+# Локальный архив всех обработанных сообщений (SQLite с полнотекстовым поиском) для запросов
+# вида "было ли это слово на прошлой неделе": python scripts/archive_search.py search "шлях" --since 7d
+# Сообщения записываются пачками по ARCHIVE_BATCH_SIZE (или раз в 2 секунды)
+ARCHIVE_ENABLED = False
+ARCHIVE_PATH = "archive.db"
+ARCHIVE_BATCH_SIZE = 500
+
+# Поиск по длинным сообщениям (от OFFLOAD_MIN_LENGTH символов) в пуле из OFFLOAD_WORKERS
+# процессов, чтобы не задерживать event loop (0 - выключено, все проверяется в основном процессе)
+OFFLOAD_WORKERS = 0
+OFFLOAD_MIN_LENGTH = 2000
+
+# Режим нескольких процессов (python supervisor.py): число процессов-воркеров, между
+# которыми распределяются каналы, и пауза перед перезапуском упавшего воркера (секунды)
+SHARD_WORKERS = 4
+WORKER_RESTART_DELAY = 10
+
+# Логирование: уровень (DEBUG, INFO, WARNING) и формат (json - для journald, text - для терминала)
+# Не больше LOG_RATE_LIMIT одинаковых записей за LOG_RATE_INTERVAL секунд (0 - без ограничения);
+# совпадения и отправленные уведомления записываются всегда
+LOG_LEVEL = "INFO"
+LOG_FORMAT = "json"
+LOG_RATE_LIMIT = 20
+LOG_RATE_INTERVAL = 60
+
+# Отладка: на уровне DEBUG повторно проверять сообщения без совпадений простым перебором
+DEBUG_SELF_CHECK = False
+
+# HTTP-эндпоинт метрик Prometheus: http://METRICS_HOST:METRICS_PORT/metrics (0 - выключен)
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+
+# Как часто проверять изменения config.py и .env (секунды, 0 - только по SIGHUP)
+# При изменении перезагружаются ключевые слова и список каналов (без перезапуска клиента)
+CONFIG_WATCH_INTERVAL = 5
@@ -0,0 +1,141 @@
+"""
+Отсев повторов: пересланные и перепощенные копии одного сообщения
+Для сообщения вычисляются отпечатки - хэш нормализованного текста и ID
+исходного сообщения (для пересылки - оригинала). Отпечатки хранятся в
+ограниченном LRU со сроком жизни и сохраняются в компактный двоичный файл,
+поэтому повторы отсеиваются и после перезапуска сервиса
+"""
+
+import asyncio
+import hashlib
+import os
+import pathlib
+import struct
+import time
+from collections import OrderedDict
+from typing import Iterable, List
+
+from telethon.utils import get_peer_id
+
+from log import get_logger
+
+log = get_logger("dedup")
+
+# Запись файла: 8 байт отпечатка + время последнего появления (float64)
+_RECORD = struct.Struct("<8sd")
+
+
+def _digest(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=8).digest()
+
+
+def message_fingerprints(event, normalized_text: str, scope: str = None) -> List[bytes]:
+    """
+    Отпечатки сообщения:
+    - ID исходного сообщения (у пересланного - канал и ID оригинала),
+      поэтому пересылка уже найденного сообщения считается повтором
+    - хэш нормализованного текста (репост с копированием текста)
+    scope - чат уведомления: повторы отсеиваются отдельно для каждого чата
+    (когда уведомления одного сообщения в разные чаты проверяются по отдельности)
+    """
+    message = event.message
+    fingerprints = []
+    origin = None
+    forward = getattr(message, "fwd_from", None)
+    if forward is not None and getattr(forward, "from_id", None) is not None and forward.channel_post:
+        origin = (get_peer_id(forward.from_id), forward.channel_post)
+    elif event.chat_id is not None:
+        origin = (event.chat_id, message.id)
+    if origin is not None:
+        fingerprints.append(_digest(b"o:%d:%d" % origin))
+    if normalized_text:
+        fingerprints.append(_digest(b"t:" + normalized_text.encode("utf-8")))
+    if scope is not None:
+        prefix = b"c:" + scope.encode("utf-8") + b":"
+        fingerprints = [_digest(prefix + fingerprint) for fingerprint in fingerprints]
+    return fingerprints
+
+
+class DedupStore:
+    """
+    Отпечатки недавно обработанных сообщений
+    Не больше max_entries записей (самые давние вытесняются) и не старше ttl секунд
+    """
+
+    def __init__(self, path, max_entries: int = 100000, ttl: float = 3 * 24 * 3600):
+        self.path = pathlib.Path(path)
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        # Отпечаток -> время последнего появления; порядок - от давних к свежим
+        self._entries: "OrderedDict[bytes, float]" = OrderedDict()
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def load(self):
+        """Загружает сохраненные отпечатки (если файл есть), пропуская устаревшие"""
+        try:
+            data = self.path.read_bytes()
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            log.warning("Не удалось прочитать отпечатки сообщений",
+                        extra={"path": str(self.path), "error": str(e)})
+            return
+        now = time.time()
+        usable = len(data) - len(data) % _RECORD.size
+        for fingerprint, seen in _RECORD.iter_unpack(data[:usable]):
+            if now - seen < self.ttl:
+                self._entries[fingerprint] = seen
+        self._evict(now)
+
+    def save(self):
+        """Сохраняет отпечатки, если они изменились (атомарно, через временный файл)"""
+        if not self._dirty:
+            return
+        self._evict(time.time())
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(b"".join(_RECORD.pack(fingerprint, seen) for fingerprint, seen in self._entries.items()))
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+    def check_and_add(self, fingerprints: Iterable[bytes]) -> bool:
+        """
+        Возвращает True, если хотя бы один отпечаток уже встречался за ttl
+        Все отпечатки запоминаются (или обновляется время их появления)
+        """
+        now = time.time()
+        entries = self._entries
+        duplicate = False
+        for fingerprint in fingerprints:
+            seen = entries.pop(fingerprint, None)
+            if seen is not None and now - seen < self.ttl:
+                duplicate = True
+            entries[fingerprint] = now
+            self._dirty = True
+        self._evict(now)
+        return duplicate
+
+    def _evict(self, now: float):
+        entries = self._entries
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+        # Записи упорядочены по времени появления - устаревшие в начале
+        while entries:
+            fingerprint, seen = next(iter(entries.items()))
+            if now - seen < self.ttl:
+                break
+            del entries[fingerprint]
+            self._dirty = True
+
+    async def autosave(self, interval: float = 10.0):
+        """Периодически сохраняет отпечатки на диск"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.save()
+            except OSError as e:
+                log.warning("Не удалось сохранить отпечатки сообщений",
+                            extra={"path": str(self.path), "error": str(e)})
@@ -0,0 +1,162 @@
+"""
+Получатели уведомлений и маршрутизация по ним
+Уведомление может уйти в несколько чатов (от бота или от основного аккаунта)
+в зависимости от найденных ключевых слов и канала. У каждого чата свой
+ограничитель скорости (token bucket) по лимитам Telegram, а у каждого
+отправителя - общий, поэтому медленный чат не задерживает остальные
+"""
+
+import asyncio
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from entity_cache import NotifyTarget
+
+SENDERS = ("bot", "user")
+
+
+class TokenBucket:
+    """
+    Ограничитель скорости: не больше rate операций в секунду в среднем
+    и не больше burst подряд
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.waited = 0.0    # Суммарное время ожидания (секунды)
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Ждет, пока можно будет выполнить операцию"""
+        while True:
+            now = time.monotonic()
+            self._refill(now)
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return
+            delay = (1.0 - self.tokens) / self.rate
+            self.waited += delay
+            await asyncio.sleep(delay)
+
+
+class Destination:
+    """Чат для уведомлений, отправитель и ограничитель скорости"""
+
+    def __init__(self, name: Optional[str], target: NotifyTarget, sender: Optional[str],
+                 limiter: TokenBucket):
+        self.name = name          # Имя из config.DESTINATIONS (None - NOTIFY_CHAT_ID)
+        self.target = target
+        self.sender = sender      # "bot", "user" или None (бот, если он подключен)
+        self.limiter = limiter
+
+
+class NotifyRoute(NamedTuple):
+    """Маршрут из config.NOTIFY_ROUTES"""
+    to: tuple                           # Имена получателей ("default" - NOTIFY_CHAT_ID)
+    keywords: Optional[frozenset] = None   # Ключевые слова или имена правил (None - любые)
+    channels: Optional[frozenset] = None   # Каналы, как они указаны в конфиге (None - любые)
+
+
+def is_group(chat_id: str) -> bool:
+    """Группа или канал (отрицательный ID или username), а не личный чат"""
+    if chat_id.lower() == "me":
+        return False
+    try:
+        return int(chat_id) < 0
+    except ValueError:
+        return True
+
+
+class Router:
+    """
+    Получатели уведомлений и маршруты к ним
+    Получатель задается именем из config.DESTINATIONS, None (NOTIFY_CHAT_ID)
+    или ID чата (поле "chat" в правилах config.RULES). Имена и чаты правил
+    хранятся отдельно, и неизвестный получатель не превращается в новый чат:
+    иначе уведомление из outbox для удаленного получателя "ops" ушло бы @ops
+    """
+
+    def __init__(self, default_target: Optional[NotifyTarget], destinations: Dict[str, dict] = None,
+                 routes: Iterable[dict] = (), private_rate: float = 1.0, group_rate: float = 20 / 60,
+                 burst: float = 3, sender_rates: Dict[str, float] = None, chats: Iterable[str] = ()):
+        self.private_rate = private_rate
+        self.group_rate = group_rate
+        self.burst = burst
+        # Общие ограничители отправителей (лимит Telegram на все чаты сразу)
+        self.sender_limiters = {
+            sender: TokenBucket(rate, burst=rate) for sender, rate in (sender_rates or {}).items()
+        }
+        self._destinations: Dict[Optional[str], Destination] = {}
+        if default_target is not None:
+            self._destinations[None] = self._create(None, default_target, None)
+        for name, options in (destinations or {}).items():
+            sender = options.get("sender")
+            if sender is not None and sender not in SENDERS:
+                raise ValueError(f"неизвестный отправитель {sender!r} у получателя {name!r}")
+            self._destinations[name] = self._create(name, NotifyTarget(str(options["chat"])), sender)
+        # Чаты из правил config.RULES
+        self._chats: Dict[str, Destination] = {}
+        default = self._destinations.get(None)
+        for chat in chats:
+            chat = str(chat)
+            if default is not None and default.target.chat_id == chat:
+                self._chats[chat] = default
+            elif chat not in self._chats:
+                self._chats[chat] = self._create(chat, NotifyTarget(chat), None)
+
+        self.routes: List[NotifyRoute] = []
+        for route in routes:
+            to = tuple(None if name == "default" else name for name in route["to"])
+            for name in to:
+                if name not in self._destinations:
+                    raise ValueError(f"неизвестный получатель {name or 'default'!r} в NOTIFY_ROUTES")
+            self.routes.append(NotifyRoute(
+                to=to,
+                keywords=frozenset(route["keywords"]) if route.get("keywords") else None,
+                channels=frozenset(str(name) for name in route["channels"]) if route.get("channels") else None
+            ))
+
+    def _create(self, name: Optional[str], target: NotifyTarget, sender: Optional[str]) -> Destination:
+        rate = self.group_rate if is_group(target.chat_id) else self.private_rate
+        return Destination(name, target, sender, TokenBucket(rate, burst=self.burst))
+
+    def _all(self) -> List[Destination]:
+        destinations = list(self._destinations.values())
+        destinations.extend(d for d in self._chats.values() if d not in destinations)
+        return destinations
+
+    def __len__(self) -> int:
+        return len(self._all())
+
+    def __iter__(self):
+        return iter(self._all())
+
+    def get(self, name: Optional[str] = None) -> Optional[Destination]:
+        """Получатель по имени или чат правила; None, если такого получателя нет в конфиге"""
+        destination = self._destinations.get(name)
+        if destination is None and name is not None:
+            destination = self._chats.get(name)
+        return destination
+
+    def resolve(self, channel: str, keywords: Iterable[str], chat: Optional[str] = None) -> List[Optional[str]]:
+        """
+        Получатели уведомления: чат из правила (chat) и все подошедшие маршруты
+        Если ничего не подошло - NOTIFY_CHAT_ID (None)
+        """
+        result = [chat] if chat is not None else []
+        keywords = set(keywords)
+        for route in self.routes:
+            if route.channels is not None and channel not in route.channels:
+                continue
+            if route.keywords is not None and route.keywords.isdisjoint(keywords):
+                continue
+            for name in route.to:
+                if name not in result:
+                    result.append(name)
+        return result or [None]
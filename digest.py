@@ -0,0 +1,119 @@
+"""
+Режим дайджеста: совпадения собираются за окно времени (или до заданного
+количества) и отправляются одним сообщением, сгруппированным по ключевым словам
+Так на активных каналах отправляется меньше сообщений и реже возникает FloodWait
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Awaitable, Callable, List, NamedTuple, Optional
+
+# Максимальная длина одного сообщения в Telegram
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+def split_message(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[str]:
+    """
+    Разбивает текст на части не длиннее limit символов
+    Разрез делается по границе абзаца, строки или слова, если это возможно
+    """
+    parts = []
+    while len(text) > limit:
+        cut = -1
+        for separator in ("\n\n", "\n", " "):
+            cut = text.rfind(separator, 0, limit)
+            if cut > limit // 2:
+                break
+        if cut <= 0:
+            cut = limit
+        parts.append(text[:cut].rstrip())
+        text = text[cut:].lstrip()
+    if text:
+        parts.append(text)
+    return parts
+
+
+class DigestEntry(NamedTuple):
+    """Одно совпадение в дайджесте"""
+    channel_name: str
+    message_id: int
+    keywords: list
+    message_text: str
+    channel_link: Optional[str] = None
+    edited: bool = False
+    severity: Optional[str] = None   # Важность сработавших правил (config.RULES)
+
+
+def format_digest(entries: List[DigestEntry], preview_length: int = 300) -> str:
+    """
+    Формирует текст дайджеста: совпадения сгруппированы по первому
+    найденному ключевому слову, остальные слова указаны рядом
+    """
+    groups = {}
+    for entry in entries:
+        groups.setdefault(entry.keywords[0], []).append(entry)
+
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    digest = f"🔔 **ДАЙДЖЕСТ СОВПАДЕНИЙ: {len(entries)}**\n"
+    digest += f"🕐 **Время:** {timestamp}\n"
+    for keyword, group in groups.items():
+        digest += f"\n🔑 **{keyword}** ({len(group)})\n"
+        for entry in group:
+            title = f"{entry.channel_name}, сообщение {entry.message_id}"
+            if entry.channel_link:
+                title = f"[{title}]({entry.channel_link})"
+            other_keywords = entry.keywords[1:]
+            if other_keywords:
+                title += f" (+ {', '.join(other_keywords)})"
+            if entry.severity and entry.severity != "normal":
+                title += f" ⚠️ **{entry.severity}**"
+            preview = " ".join(entry.message_text.split())
+            if len(preview) > preview_length:
+                preview = preview[:preview_length] + "..."
+            icon = "✏️" if entry.edited else "📺"
+            digest += f"\n{icon} {title}\n{preview}\n"
+    return digest
+
+
+class DigestBuffer:
+    """
+    Накапливает совпадения и отправляет их одним дайджестом:
+    через window секунд после первого совпадения или при max_alerts совпадениях
+    """
+
+    def __init__(self, send: Callable[[str], Awaitable[None]], window: float = 60.0,
+                 max_alerts: int = 20, preview_length: int = 300):
+        self.send = send
+        self.window = window
+        self.max_alerts = max(1, max_alerts)
+        self.preview_length = preview_length
+        self._entries: List[DigestEntry] = []
+        self._timer: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def add(self, entry: DigestEntry):
+        """Добавляет совпадение в дайджест"""
+        self._entries.append(entry)
+        if len(self._entries) >= self.max_alerts:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self):
+        """Отправляет накопленные совпадения (если они есть)"""
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+        self._timer = None
+        entries, self._entries = self._entries, []
+        if not entries:
+            return
+        text = format_digest(entries, self.preview_length)
+        for part in split_message(text):
+            await self.send(part)
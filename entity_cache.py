@@ -0,0 +1,184 @@
+"""
+Кэш entity Telegram
+- NotifyTarget: чат для уведомлений, определяется один раз при запуске
+  и переопределяется только после ошибки отправки, связанной с peer
+- ChatCache: информация о каналах по chat_id с ограниченным временем жизни
+- ChannelCache: chat_id каналов по имени из конфига, сохраняется на диск,
+  чтобы при перезапуске не запрашивать entity каналов до начала мониторинга
+"""
+
+import json
+import os
+import pathlib
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from telethon import errors
+from telethon.tl.types import InputPeerSelf
+
+from log import get_logger
+
+log = get_logger("entity_cache")
+
+# Ошибки отправки, после которых нужно заново определить чат для уведомлений
+PEER_ERRORS = (
+    ValueError,
+    errors.PeerIdInvalidError,
+    errors.ChatIdInvalidError,
+    errors.ChannelInvalidError,
+    errors.ChannelPrivateError,
+)
+
+
+class NotifyTarget:
+    """
+    Чат для уведомлений (NOTIFY_CHAT_ID), закэшированный как InputPeer
+    Для каждого клиента (бот или аккаунт) хранится свой InputPeer,
+    так как access_hash у них разный
+    """
+
+    def __init__(self, chat_id: str):
+        self.chat_id = chat_id
+        self.resolved_id = None      # Формат ID, по которому удалось найти чат
+        self._peers: Dict[Any, Any] = {}
+
+    def _candidates(self) -> list:
+        """Варианты ID в порядке перебора"""
+        if self.chat_id.lower() == 'me':
+            return []
+        try:
+            chat_id = int(self.chat_id)
+        except ValueError:
+            # Если chat_id не число, используем как есть (username)
+            return [self.chat_id]
+        candidates = [chat_id]
+        # Для групп/каналов может быть -100XXXXXXXXXX или -XXXXXXXXXX
+        if chat_id < 0 and len(str(abs(chat_id))) < 13:
+            candidates.append(int(f"-100{abs(chat_id)}"))
+        return candidates
+
+    async def resolve(self, client) -> Any:
+        """
+        Определяет чат для уведомлений и кэширует InputPeer для клиента
+        Сначала пробует ранее сработавший формат ID
+        """
+        if self.chat_id.lower() == 'me':
+            peer = InputPeerSelf()
+            self._peers[client] = peer
+            return peer
+
+        candidates = self._candidates()
+        if self.resolved_id in candidates:
+            candidates.remove(self.resolved_id)
+            candidates.insert(0, self.resolved_id)
+
+        last_error = None
+        for candidate in candidates:
+            try:
+                peer = await client.get_input_entity(candidate)
+            except (ValueError, TypeError) as e:
+                last_error = e
+                continue
+            self.resolved_id = candidate
+            self._peers[client] = peer
+            return peer
+
+        # В последнюю очередь пробуем отправлять напрямую по ID
+        if isinstance(candidates[0], int):
+            self._peers[client] = candidates[0]
+            return candidates[0]
+        raise ValueError(f"Не удалось найти чат {self.chat_id}: {last_error}")
+
+    async def get(self, client) -> Any:
+        """Возвращает закэшированный InputPeer (без запросов к Telegram)"""
+        peer = self._peers.get(client)
+        if peer is None:
+            peer = await self.resolve(client)
+        return peer
+
+    def invalidate(self, client=None):
+        """Сбрасывает кэш (для одного клиента или для всех)"""
+        if client is None:
+            self._peers.clear()
+        else:
+            self._peers.pop(client, None)
+
+
+class ChatCache:
+    """
+    Кэш event.get_chat() по chat_id с временем жизни ttl секунд
+    """
+
+    def __init__(self, ttl: float = 600.0):
+        self.ttl = ttl
+        self._chats: Dict[int, Tuple[float, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, event) -> Any:
+        """Возвращает информацию о чате события, запрашивая ее не чаще раза в ttl"""
+        chat_id = event.chat_id
+        now = time.monotonic()
+        cached = self._chats.get(chat_id)
+        if cached is not None and cached[0] > now:
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        chat = await event.get_chat()
+        if chat is not None:
+            self._chats[chat_id] = (now + self.ttl, chat)
+        return chat
+
+    def invalidate(self, chat_id: int = None):
+        """Сбрасывает кэш (для одного чата или для всех)"""
+        if chat_id is None:
+            self._chats.clear()
+        else:
+            self._chats.pop(chat_id, None)
+
+
+class ChannelCache:
+    """
+    chat_id каналов по имени (как оно указано в CHANNEL_NAME/CHANNELS)
+    Хранится в JSON-файле, запись выполняется атомарно (через временный файл)
+    access_hash каналов хранит файл сессии Telethon, поэтому по chat_id
+    из кэша подписка работает без запросов к Telegram
+    """
+
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self.peer_ids: Dict[str, int] = {}
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self.peer_ids)
+
+    def load(self):
+        """Загружает сохраненный кэш (если файл есть)"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            log.warning("Не удалось прочитать кэш каналов", extra={"path": str(self.path), "error": str(e)})
+            return
+        self.peer_ids = {str(name): int(peer_id) for name, peer_id in data.items()}
+
+    def save(self):
+        """Сохраняет кэш, если он изменился"""
+        if not self._dirty:
+            return
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.peer_ids, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+    def get(self, name: str) -> Optional[int]:
+        return self.peer_ids.get(name)
+
+    def update(self, name: str, peer_id: int):
+        if self.peer_ids.get(name) != peer_id:
+            self.peer_ids[name] = peer_id
+            self._dirty = True
@@ -0,0 +1,120 @@
+"""
+Структурированное логирование
+Каждая запись выводится в stdout одной строкой JSON (для journald),
+часто повторяющиеся записи ограничиваются по частоте
+"""
+
+import json
+import logging
+import sys
+import time
+from typing import Dict, Tuple
+
+# Стандартные атрибуты LogRecord; все остальные (переданные через extra) - поля записи
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+# Поле extra, снимающее ограничение частоты: совпадения и отправленные уведомления
+# должны попадать в журнал всегда (view_logs.sh matches), даже при всплеске сообщений
+UNLIMITED = "_unlimited"
+
+
+class JsonFormatter(logging.Formatter):
+    """Форматирует запись как JSON: время, уровень, логгер, сообщение и поля из extra"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Человекочитаемый формат для запуска в терминале"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = f"{self.formatTime(record, '%H:%M:%S')} {record.levelname:<7} {record.getMessage()}"
+        fields = {key: value for key, value in record.__dict__.items()
+                  if key not in _RECORD_ATTRS and not key.startswith("_")}
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Пропускает не больше burst записей с одним шаблоном сообщения за interval секунд
+    Число отброшенных записей добавляется полем suppressed к следующей пропущенной
+    Записи уровня ERROR и выше и записи с полем UNLIMITED не ограничиваются
+    """
+
+    def __init__(self, burst: int = 20, interval: float = 60.0):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        # (логгер, шаблон) -> [начало окна, пропущено в окне, отброшено]
+        self._windows: Dict[Tuple[str, str], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.burst <= 0 or record.levelno >= logging.ERROR or getattr(record, UNLIMITED, False):
+            return True
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.interval:
+            suppressed = window[2] if window else 0
+            self._windows[key] = [now, 1, 0]
+            if suppressed:
+                record.suppressed = suppressed
+            return True
+        if window[1] < self.burst:
+            window[1] += 1
+            return True
+        window[2] += 1
+        return False
+
+
+class FieldsFilter(logging.Filter):
+    """Добавляет постоянные поля ко всем записям (например, номер процесса-воркера)"""
+
+    def __init__(self, fields: Dict[str, object]):
+        super().__init__()
+        self.fields = fields
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in self.fields.items():
+            setattr(record, key, value)
+        return True
+
+
+def setup_logging(level: str = "INFO", fmt: str = "json", burst: int = 20, interval: float = 60.0,
+                  fields: Dict[str, object] = None):
+    """
+    Настраивает корневой логгер: вывод в stdout, формат json или text,
+    ограничение частоты повторяющихся записей
+    fields - поля, добавляемые ко всем записям
+    """
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    handler.addFilter(RateLimitFilter(burst=burst, interval=interval))
+    if fields:
+        handler.addFilter(FieldsFilter(fields))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+    # Telethon пишет много служебных сообщений - оставляем только предупреждения
+    logging.getLogger("telethon").setLevel(max(root.level, logging.WARNING))
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
@@ -4,12 +4,33 @@ Telegram Channel Monitor - MVP
 """
 
 import asyncio
+import importlib
+import logging
 import os
+import time
 from datetime import datetime
 from dotenv import load_dotenv
-from telethon import TelegramClient, events
-from telethon.tl.types import Channel
+from telethon import TelegramClient, errors, events, functions
+from telethon.extensions import markdown
+from telethon.utils import get_peer_id
 import config
+from matcher import KeywordMatcher
+from normalize import NormalizedText
+from channels import RouteTable, build_routes, compile_keywords, load_channels
+from notify_queue import Alert, AlertMessage, NotificationQueue
+from entity_cache import PEER_ERRORS, ChannelCache, ChatCache, NotifyTarget
+from digest import DigestBuffer, DigestEntry, split_message
+from backfill import MessageState, backfill_channels
+from dedup import DedupStore, message_fingerprints
+from updates import AlbumEvent, EditTracker
+from offload import MatchPool, Turn
+from outbox import Outbox, OutboxEntry, UndeliverableError
+from destinations import Destination, Router
+from archive import MessageArchive
+from reconnect import run_until_stopped
+from log import UNLIMITED, get_logger, setup_logging
+import metrics
+from reload import ConfigWatcher
 
 # Загружаем переменные окружения
 # Используем абсолютный путь к .env файлу для работы с systemd
@@ -24,304 +45,1057 @@ BOT_TOKEN = os.getenv('BOT_TOKEN')  # Токен бота для отправк
 CHANNEL_NAME = os.getenv('CHANNEL_NAME', config.CHANNEL_NAME)
 NOTIFY_CHAT_ID = os.getenv('NOTIFY_CHAT_ID')  # ID чата для уведомлений (ваш личный чат или другой канал)
 
+log = get_logger("monitor")
 
-def check_keywords(text: str) -> list:
+# Кэш чата для уведомлений и информации о каналах
+notify_target = NotifyTarget(NOTIFY_CHAT_ID) if NOTIFY_CHAT_ID else None
+chat_cache = ChatCache(ttl=config.CHAT_CACHE_TTL)
+
+
+def rule_chats() -> list:
+    """Чаты уведомлений из правил config.RULES (поле "chat")"""
+    return [str(rule["chat"]) for rule in getattr(config, "RULES", ()) if rule.get("chat") is not None]
+
+
+def build_router() -> Router:
+    """Получатели уведомлений: NOTIFY_CHAT_ID, config.DESTINATIONS и чаты из правил"""
+    return Router(
+        notify_target,
+        destinations=config.DESTINATIONS,
+        routes=config.NOTIFY_ROUTES,
+        private_rate=config.RATE_LIMIT_PRIVATE,
+        group_rate=config.RATE_LIMIT_GROUP,
+        burst=config.RATE_LIMIT_BURST,
+        sender_rates={"bot": config.RATE_LIMIT_BOT, "user": config.RATE_LIMIT_USER},
+        chats=rule_chats()
+    )
+
+
+notify_router = build_router()
+
+
+def get_sender(destination: Destination, client: TelegramClient, bot_client=None):
+    """Клиент для отправки получателю и его тип ("bot" или "user")"""
+    if destination.sender == "user" or bot_client is None:
+        return client, "user"
+    return bot_client, "bot"
+
+
+async def wait_rate_limit(destination: Destination, sender: str):
+    """Ждет разрешения ограничителей скорости получателя и отправителя"""
+    started = time.monotonic()
+    await destination.limiter.acquire()
+    sender_limiter = notify_router.sender_limiters.get(sender)
+    if sender_limiter is not None:
+        await sender_limiter.acquire()
+    waited = time.monotonic() - started
+    if waited > 0.001:
+        metrics.RATE_LIMIT_WAIT_SECONDS.inc(destination.name or "default", amount=waited)
+
+
+def build_matcher(keywords=None) -> KeywordMatcher:
+    """
+    Компилирует список ключевых слов в автомат для поиска
+    Вызывается один раз при запуске (и при перезагрузке ключевых слов)
+    """
+    if keywords is None:
+        keywords = config.KEYWORDS
+    return compile_keywords(keywords)
+
+
+# Скомпилированный набор ключевых слов из config.KEYWORDS
+keyword_matcher = build_matcher()
+
+
+def check_keywords(text, matcher: KeywordMatcher = None) -> list:
     """
     Проверяет текст на наличие ключевых фраз
     Возвращает список найденных ключевых слов
-    Все сравнения выполняются в нижнем регистре (case-insensitive)
+    text - строка или уже нормализованный текст (NormalizedText)
+    Регистр учитывается согласно config.CASE_INSENSITIVE
     """
     if not text:
         return []
     
-    found_keywords = []
-    # Всегда переводим текст в нижний регистр для сравнения
-    # Также нормализуем пробелы и убираем лишние символы
-    text_to_check = text.lower().strip()
-    
-    # Сравниваем все ключевые слова в нижнем регистре
-    for keyword in config.KEYWORDS:
-        keyword_to_check = keyword.lower().strip()
-        if keyword_to_check and keyword_to_check in text_to_check:
-            found_keywords.append(keyword)
-    
-    return found_keywords
+    # Один проход по тексту скомпилированным автоматом вместо
+    # отдельного поиска подстроки для каждого ключевого слова
+    if matcher is None:
+        matcher = keyword_matcher
+    return matcher.match(text)
 
 
-def notify_user_console(message_text: str, keywords: list, channel_name: str, message_id: int):
+def notify_user_console(message_text: str, keywords: list, channel_name: str, message_id: int,
+                        fragments: list = None, edited: bool = False, severity: str = None):
     """
-    Выводит уведомление в консоль
+    Записывает найденное совпадение в лог
+    fragments - как совпавшие слова написаны в исходном тексте (через карту позиций)
+    """
+    extra = {
+        "channel": channel_name,
+        "keywords": keywords,
+        "message_id": message_id,
+        "text": message_text[:500],  # Первые 500 символов
+    }
+    if edited:
+        extra["edited"] = True
+    if severity:
+        extra["severity"] = severity
+    if fragments:
+        extra["fragments"] = fragments
+    extra[UNLIMITED] = True
+    log.info("Найдено совпадение", extra=extra)
+
+
+def format_notification(message_text: str, keywords: list, channel_name: str,
+                        message_id: int, channel_link: str = None, edited: bool = False,
+                        severity: str = None) -> str:
+    """
+    Формирует текст уведомления о найденном совпадении
     """
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print("\n" + "="*60)
-    print(f"🔔 НАЙДЕНО СОВПАДЕНИЕ! [{timestamp}]")
-    print(f"📺 Канал: {channel_name}")
-    print(f"🔑 Ключевые слова: {', '.join(keywords)}")
-    print(f"📝 Сообщение ID: {message_id}")
-    print("-"*60)
-    print(f"Текст сообщения:\n{message_text[:500]}...")  # Первые 500 символов
-    print("="*60 + "\n")
+    
+    if edited:
+        notification = f"✏️ **СОВПАДЕНИЕ В ОТРЕДАКТИРОВАННОМ СООБЩЕНИИ!**\n\n"
+    else:
+        notification = f"🔔 **НАЙДЕНО СОВПАДЕНИЕ!**\n\n"
+    notification += f"📺 **Канал:** {channel_name}\n"
+    notification += f"🔑 **Ключевые слова:** {', '.join(keywords)}\n"
+    if severity and severity != "normal":
+        notification += f"⚠️ **Важность:** {severity}\n"
+    notification += f"📝 **ID сообщения:** {message_id}\n"
+    notification += f"🕐 **Время:** {timestamp}\n\n"
+    
+    if channel_link:
+        notification += f"🔗 [Открыть канал]({channel_link})\n\n"
+    
+    notification += f"**Текст сообщения:**\n\n"
+    notification += message_text
+    return notification
 
 
-async def notify_user_telegram(client: TelegramClient, message_text: str, keywords: list, 
-                               channel_name: str, message_id: int, channel_link: str = None, bot_client=None):
+async def send_notification(client: TelegramClient, text: str, bot_client=None, chat: str = None):
     """
-    Отправляет уведомление в Telegram
-    Использует бота, если указан BOT_TOKEN, иначе использует основной клиент
+    Отправляет текст получателю уведомлений (chat - имя из config.DESTINATIONS
+    или чат из правила, None - NOTIFY_CHAT_ID)
+    Длинный текст разбивается на части по лимиту Telegram (4096 символов)
+    Использует бота, если указан BOT_TOKEN (и получателю не задан sender "user"),
+    иначе использует основной клиент
     """
-    if not NOTIFY_CHAT_ID:
+    destination = notify_router.get(chat)
+    if destination is None:
+        return
+    
+    # Уведомление записывается в outbox и отправляется им (с повторами при ошибках)
+    outbox = getattr(handler, 'outbox', None)
+    if outbox is not None:
+        for part in split_message(text):
+            outbox.add(chat, part)
         return
     
     # Определяем какой клиент использовать для отправки
-    send_client = bot_client if bot_client else client
+    send_client, sender = get_sender(destination, client, bot_client)
+    target = destination.target
     
     try:
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        # Формируем сообщение
-        notification = f"🔔 **НАЙДЕНО СОВПАДЕНИЕ!**\n\n"
-        notification += f"📺 **Канал:** {channel_name}\n"
-        notification += f"🔑 **Ключевые слова:** {', '.join(keywords)}\n"
-        notification += f"📝 **ID сообщения:** {message_id}\n"
-        notification += f"🕐 **Время:** {timestamp}\n\n"
+        # Чат для уведомлений определяется один раз и берется из кэша
+        entity = await target.get(send_client)
         
-        if channel_link:
-            notification += f"🔗 [Открыть канал]({channel_link})\n\n"
-        
-        notification += f"**Текст сообщения:**\n\n"
-        notification += message_text[:2000]  # Ограничение длины сообщения в Telegram
-        
-        # Определяем куда отправлять
-        if NOTIFY_CHAT_ID.lower() == 'me':
-            entity = 'me'
-        else:
-            try:
-                chat_id = int(NOTIFY_CHAT_ID)
-                # Пытаемся получить entity по ID
+        for part in split_message(text):
+            await wait_rate_limit(destination, sender)
+            with metrics.SEND_LATENCY.time():
                 try:
-                    # Используем send_client для получения entity
-                    entity = await send_client.get_entity(chat_id)
-                except (ValueError, TypeError):
-                    # Если не получается, пробуем разные форматы ID
-                    # Для групп/каналов может быть -100XXXXXXXXXX или -XXXXXXXXXX
-                    try:
-                        # Если ID отрицательный и меньше 13 цифр, пробуем добавить -100
-                        if chat_id < 0 and len(str(abs(chat_id))) < 13:
-                            entity_with_prefix = int(f"-100{abs(chat_id)}")
-                            entity = await send_client.get_entity(entity_with_prefix)
-                        else:
-                            # Пробуем отправить напрямую по числу
-                            entity = chat_id
-                    except:
-                        # В последнюю очередь пробуем отправить напрямую
-                        entity = chat_id
-            except ValueError:
-                # Если chat_id не число, используем как есть (username)
-                entity = NOTIFY_CHAT_ID
-        
-        # Отправляем сообщение
-        await send_client.send_message(entity, notification, parse_mode='markdown')
-        sender = "бот" if bot_client else "аккаунт"
-        print(f"✅ Уведомление отправлено в Telegram от {sender} (chat_id: {NOTIFY_CHAT_ID})")
+                    await send_client.send_message(entity, part, parse_mode='markdown')
+                except PEER_ERRORS:
+                    # Чат мог измениться (например, группа стала супергруппой) -
+                    # определяем его заново и повторяем отправку один раз
+                    target.invalidate(send_client)
+                    entity = await target.resolve(send_client)
+                    await send_client.send_message(entity, part, parse_mode='markdown')
+        log.info(
+            "Уведомление отправлено в Telegram",
+            extra={"sender": sender, "chat_id": target.chat_id, UNLIMITED: True}
+        )
         
+    except errors.FloodWaitError as e:
+        metrics.SEND_FAILURES.inc("flood_wait")
+        metrics.FLOOD_WAIT_SECONDS.inc(amount=e.seconds)
+        log.warning("FloodWait при отправке уведомления", extra={"seconds": e.seconds, "chat_id": target.chat_id})
     except ValueError as e:
-        print(f"⚠️  Ошибка: Не удалось найти чат с ID {NOTIFY_CHAT_ID}")
-        print(f"   Убедитесь, что:")
-        print(f"   1. Бот добавлен в группу/канал")
-        print(f"   2. Chat ID указан правильно")
-        print(f"   3. Для групп используйте формат: -100XXXXXXXXXX или -XXXXXXXXXX")
+        metrics.SEND_FAILURES.inc("peer")
+        log.warning(
+            "Не удалось найти чат для уведомлений. Убедитесь, что бот добавлен в группу/канал, "
+            "а chat_id указан правильно (для групп: -100XXXXXXXXXX или -XXXXXXXXXX)",
+            extra={"chat_id": target.chat_id, "error": str(e)}
+        )
     except Exception as e:
-        print(f"⚠️  Ошибка при отправке уведомления в Telegram: {e}")
+        metrics.SEND_FAILURES.inc("error")
+        log.warning("Ошибка при отправке уведомления в Telegram", extra={"error": str(e)})
 
 
-async def handler(event, channel_name: str, client: TelegramClient):
+async def send_outbox_entry(client: TelegramClient, entry: OutboxEntry):
+    """
+    Отправляет уведомление из outbox (см. outbox.py)
+    Ошибка пробрасывается: outbox повторит отправку позже. Сообщение отправляется
+    с random_id записи, поэтому повторная отправка уже доставленного отклоняется Telegram
+    """
+    destination = notify_router.get(entry.chat)
+    if destination is None:
+        # Получатель удален из конфига (или переименован) после постановки в outbox
+        raise UndeliverableError(f"получатель {entry.chat or 'default'!r} не настроен")
+    send_client, sender = get_sender(destination, client, getattr(handler, 'bot_client', None))
+    target = destination.target
+    message, entities = markdown.parse(entry.text)
+    await wait_rate_limit(destination, sender)
+    try:
+        with metrics.SEND_LATENCY.time():
+            entity = await target.get(send_client)
+            await send_client(functions.messages.SendMessageRequest(
+                peer=entity,
+                message=message,
+                entities=entities or None,
+                random_id=entry.random_id
+            ))
+    except errors.FloodWaitError as e:
+        metrics.SEND_FAILURES.inc("flood_wait")
+        metrics.FLOOD_WAIT_SECONDS.inc(amount=e.seconds)
+        raise
+    except errors.RandomIdDuplicateError:
+        raise
+    except PEER_ERRORS:
+        # Чат мог измениться (например, группа стала супергруппой) - при повторе определяем его заново
+        metrics.SEND_FAILURES.inc("peer")
+        target.invalidate(send_client)
+        raise
+    except Exception:
+        metrics.SEND_FAILURES.inc("error")
+        raise
+    log.info(
+        "Уведомление отправлено в Telegram",
+        extra={"sender": sender, "chat_id": target.chat_id, "outbox_id": entry.id, UNLIMITED: True}
+    )
+
+
+def start_archive() -> MessageArchive:
+    """Открывает архив сообщений (config.ARCHIVE_PATH)"""
+    archive = MessageArchive(pathlib.Path(config.ARCHIVE_PATH).absolute(), batch_size=config.ARCHIVE_BATCH_SIZE)
+    archive.open()
+    handler.archive = archive
+    return archive
+
+
+def start_outbox(client: TelegramClient) -> Outbox:
+    """Загружает журнал уведомлений (outbox.log) и запускает их отправку"""
+    async def send(entry):
+        await send_outbox_entry(client, entry)
+    
+    outbox = Outbox(
+        pathlib.Path('outbox.log').absolute(),
+        send,
+        max_age=config.OUTBOX_MAX_AGE,
+        max_backoff=config.OUTBOX_MAX_BACKOFF
+    )
+    outbox.load()
+    outbox.start()
+    handler.outbox = outbox
+    metrics.OUTBOX_PENDING.function = lambda: outbox.depth
+    return outbox
+
+
+async def notify_user_telegram(client: TelegramClient, message_text: str, keywords: list, 
+                               channel_name: str, message_id: int, channel_link: str = None, bot_client=None,
+                               edited: bool = False, severity: str = None, chat: str = None):
+    """
+    Отправляет уведомление в Telegram
+    В режиме дайджеста (config.DIGEST_MODE) совпадение добавляется в дайджест
+    (только для NOTIFY_CHAT_ID, другим получателям уведомления идут сразу)
+    """
+    destination = notify_router.get(chat)
+    if destination is None:
+        # Без NOTIFY_CHAT_ID уведомления пишутся только в лог
+        if chat is not None:
+            log.warning("Получатель уведомления не настроен", extra={"destination": chat})
+        return
+    
+    digest = getattr(handler, 'digest', None)
+    if digest is not None and destination.name is None:
+        await digest.add(DigestEntry(
+            channel_name=channel_name,
+            message_id=message_id,
+            keywords=keywords,
+            message_text=message_text,
+            channel_link=channel_link,
+            edited=edited,
+            severity=severity
+        ))
+        return
+    
+    notification = format_notification(message_text, keywords, channel_name, message_id, channel_link,
+                                       edited, severity)
+    await send_notification(client, notification, bot_client, chat)
+
+
+async def handler(event, channel_name: str, client: TelegramClient, matcher: KeywordMatcher = None,
+                  edited: bool = False):
     """
     Обработчик новых сообщений из канала
+    matcher - набор ключевых слов этого канала (по умолчанию общий KEYWORDS)
+    edited - сообщение отредактировано: уведомление отправляется, только если
+    появились ключевые слова, которых не было в предыдущей версии
     """
+    if matcher is None:
+        matcher = keyword_matcher
+    metrics.MESSAGES_RECEIVED.inc(channel_name)
+    
+    pool = getattr(handler, 'match_pool', None)
+    if pool is None:
+        await process_message(event, channel_name, client, matcher, edited)
+        return
+    
+    # Длинные сообщения проверяются в пуле процессов (см. offload.py), а результаты
+    # выдаются в порядке сообщений канала, даже если длинное проверяется дольше следующих
+    turn = pool.order.reserve(event.chat_id)
+    try:
+        await process_message(event, channel_name, client, matcher, edited, pool, turn)
+    finally:
+        turn.release()
+
+
+async def process_message(event, channel_name: str, client: TelegramClient, matcher: KeywordMatcher,
+                          edited: bool = False, pool: MatchPool = None, turn: Turn = None):
+    """Поиск ключевых слов в сообщении и постановка уведомления в очередь"""
     message = event.message
     message_text = message.message or ""
     
-    # Отладочное логирование (можно отключить позже)
-    print(f"📨 Получено сообщение ID: {message.id}, Текст: {message_text[:100]}...")
-    
     # Проверяем на наличие ключевых слов
-    found_keywords = check_keywords(message_text)
-    
-    if found_keywords:
-        print(f"✅ Найдены ключевые слова: {found_keywords}")
+    # Текст нормализуется один раз и дальше используется и поиском, и уведомлением
+    started = time.perf_counter()
+    found_keywords = None
+    if pool is not None and pool.should_offload(message_text, matcher):
+        metrics.OFFLOADED_MATCHES.inc()
+        normalized, found_keywords = await pool.match(matcher, message_text)
     else:
-        # Отладочная информация для диагностики
-        text_lower = message_text.lower() if message_text else ""
-        print(f"ℹ️  Ключевые слова не найдены в сообщении")
-        print(f"   Ищем: {[k.lower() for k in config.KEYWORDS]}")
-        # Показываем весь текст (или первые 500 символов, если очень длинный)
-        text_preview = text_lower if len(text_lower) <= 500 else text_lower[:500] + "..."
-        print(f"   Текст целиком (в lower, {len(text_lower)} символов): {text_preview}")
-        # Проверяем вручную для отладки
-        for keyword in config.KEYWORDS:
-            keyword_lower = keyword.lower()
-            if keyword_lower in text_lower:
-                # Находим позицию вхождения
-                pos = text_lower.find(keyword_lower)
-                context_start = max(0, pos - 20)
-                context_end = min(len(text_lower), pos + len(keyword_lower) + 20)
-                context = text_lower[context_start:context_end]
-                print(f"   ⚠️  ОШИБКА: '{keyword_lower}' НАЙДЕНО в позиции {pos}!")
-                print(f"      Контекст: ...{context}...")
+        normalized = matcher.normalize(message_text)
+    
+    # Предыдущая версия сообщения (для отредактированных)
+    edits = getattr(handler, 'edits', None)
+    previous = edits.get(event.chat_id, message.id) if edits is not None else None
+    tracked_edit = edited and previous is not None
+    if edited and previous is not None and previous.text_hash == hash(normalized.text):
+        # Текст не изменился (например, заменено только медиа)
+        return
+    
+    # Архив всех сообщений для поиска (запись на диск - пачками, в отдельном потоке)
+    archive = getattr(handler, 'archive', None)
+    if archive is not None:
+        archive.add(event.chat_id, message.id, message.date, channel_name, message_text)
+    
+    if found_keywords is None:
+        found_keywords = check_keywords(normalized, matcher)
+    metrics.MATCH_LATENCY.observe(time.perf_counter() - started)
+    if turn is not None:
+        await turn.wait()
+    if edits is not None:
+        edits.remember(event.chat_id, message.id, normalized.text, found_keywords)
+    if edited and previous is not None and set(found_keywords) <= set(previous.keywords):
+        # Новых совпадений после редактирования нет - повторно не уведомляем
+        return
     
     if found_keywords:
-        # Получаем информацию о канале
-        channel = await event.get_chat()
-        channel_title = getattr(channel, 'title', channel_name) or channel_name
-        
-        # Формируем ссылку на канал
-        channel_link = None
-        if hasattr(channel, 'username') and channel.username:
-            channel_link = f"https://t.me/{channel.username}/{message.id}"
-        
-        # Выводим в консоль
-        notify_user_console(
-            message_text=message_text,
-            keywords=found_keywords,
-            channel_name=channel_title,
-            message_id=message.id
+        # Пересланные и перепощенные копии уже найденного сообщения не уведомляем.
+        # Отредактированное сообщение с известной предыдущей версией проверено выше;
+        # если версии нет (сообщение до перезапуска или вытесненное из EditTracker),
+        # о нем уже уведомляли, когда его отпечаток есть в dedup
+        dedup = getattr(handler, 'dedup', None)
+        if (dedup is not None and dedup.check_and_add(message_fingerprints(event, normalized.text))
+                and not tracked_edit):
+            metrics.DUPLICATES_DROPPED.inc(channel_name)
+            log.debug(
+                "Повтор уже найденного сообщения",
+                extra={"chat_id": event.chat_id, "message_id": message.id, "keywords": found_keywords}
+            )
+            return
+        for keyword in found_keywords:
+            metrics.KEYWORD_MATCHES.inc(keyword)
+        log.debug(
+            "Найдены ключевые слова",
+            extra={"chat_id": event.chat_id, "message_id": message.id, "keywords": found_keywords}
         )
-        
-        # Отправляем в Telegram
-        # Получаем bot_client из глобального контекста (если есть)
-        bot_client = getattr(handler, 'bot_client', None)
-        await notify_user_telegram(
+    elif log.isEnabledFor(logging.DEBUG):
+        # Отладочная информация выключена по умолчанию (LOG_LEVEL = "INFO"),
+        # чтобы путь без совпадений стоил одного прохода по тексту
+        log.debug(
+            "Ключевые слова не найдены",
+            extra={"chat_id": event.chat_id, "message_id": message.id, "length": len(message_text)}
+        )
+        if config.DEBUG_SELF_CHECK:
+            debug_self_check(normalized, matcher)
+    
+    if found_keywords:
+        # С правилами (config.RULES) сработавшие правила разбиваются по чатам уведомлений
+        group = getattr(matcher, 'group', None)
+        groups = group(found_keywords) if group is not None else [(None, None, found_keywords)]
+        queue = getattr(handler, 'queue', None)
+        for chat, severity, keywords in groups:
+            alert = Alert(
+                event=event,
+                client=client,
+                channel_name=channel_name,
+                message_text=message_text,
+                keywords=keywords,
+                normalized=normalized,
+                edited=edited,
+                tracked_edit=tracked_edit,
+                severity=severity,
+                chat=chat
+            )
+            # Отправка идет через очередь, чтобы не задерживать обработку
+            # следующих сообщений (без очереди - отправляем сразу)
+            if queue is not None:
+                await queue.put(alert)
+            else:
+                await deliver_alert(alert)
+
+
+def debug_self_check(normalized: NormalizedText, matcher: KeywordMatcher = None):
+    """
+    Отладка: повторно ищет ключевые слова простым перебором по нормализованному
+    тексту и сообщает, если автомат пропустил совпадение. Включается config.DEBUG_SELF_CHECK
+    """
+    log.debug("Текст сообщения", extra={"text": normalized.text[:500]})
+    if matcher is None:
+        matcher = keyword_matcher
+    if not isinstance(matcher, KeywordMatcher):
+        # В режимах word/stem совпадение подстроки не означает совпадение слова
+        return
+    for keyword in matcher.keywords:
+        fragment = normalized.find_original(keyword)
+        if fragment is not None:
+            log.error(
+                "Ключевое слово пропущено при поиске",
+                extra={"keyword": keyword, "fragment": fragment}
+            )
+
+
+async def describe_alert(alert: Alert) -> AlertMessage:
+    """
+    Собирает данные для уведомления: название канала, ссылку на сообщение
+    и фрагменты исходного текста с совпадениями
+    Результат содержит только простые данные, поэтому его можно передать
+    в другой процесс (см. supervisor.py)
+    """
+    event = alert.event
+    message = event.message
+    
+    # Получаем информацию о канале (из кэша по chat_id)
+    channel = await chat_cache.get(event)
+    channel_title = getattr(channel, 'title', alert.channel_name) or alert.channel_name
+    
+    # Формируем ссылку на канал
+    channel_link = None
+    if hasattr(channel, 'username') and channel.username:
+        channel_link = f"https://t.me/{channel.username}/{message.id}"
+    
+    # Как совпавшие слова написаны в исходном тексте (через карту позиций)
+    fragments = []
+    if alert.normalized is not None:
+        fragments = [alert.normalized.find_original(keyword) for keyword in alert.keywords]
+        fragments = [fragment for fragment in fragments if fragment]
+    
+    return AlertMessage(
+        channel_name=channel_title,
+        message_id=message.id,
+        message_text=alert.message_text,
+        keywords=list(alert.keywords),
+        channel_link=channel_link,
+        fragments=fragments,
+        edited=alert.edited,
+        tracked_edit=alert.tracked_edit,
+        severity=alert.severity,
+        chat=alert.chat,
+        # Получатели по маршрутам config.NOTIFY_ROUTES (канал - как он указан в конфиге)
+        destinations=tuple(notify_router.resolve(alert.channel_name, alert.keywords, alert.chat))
+    )
+
+
+async def notify_alert(alert_message: AlertMessage, client: TelegramClient):
+    """Отправляет уведомление (лог + Telegram)"""
+    notify_user_console(
+        message_text=alert_message.message_text,
+        keywords=alert_message.keywords,
+        channel_name=alert_message.channel_name,
+        message_id=alert_message.message_id,
+        fragments=alert_message.fragments,
+        edited=alert_message.edited,
+        severity=alert_message.severity
+    )
+    
+    # Отправляем в Telegram всем получателям параллельно
+    # Получаем bot_client из глобального контекста (если есть)
+    bot_client = getattr(handler, 'bot_client', None)
+    destinations = alert_message.destinations or (alert_message.chat,)
+    await asyncio.gather(*(
+        notify_user_telegram(
             client=client,
-            message_text=message_text,
-            keywords=found_keywords,
-            channel_name=channel_title,
-            message_id=message.id,
-            channel_link=channel_link,
-            bot_client=bot_client
+            message_text=alert_message.message_text,
+            keywords=alert_message.keywords,
+            channel_name=alert_message.channel_name,
+            message_id=alert_message.message_id,
+            channel_link=alert_message.channel_link,
+            bot_client=bot_client,
+            edited=alert_message.edited,
+            severity=alert_message.severity,
+            chat=destination
+        )
+        for destination in destinations
+    ))
+
+
+async def deliver_alert(alert: Alert):
+    """
+    Отправляет уведомление о найденном совпадении (лог + Telegram)
+    Вызывается воркерами очереди уведомлений
+    """
+    await notify_alert(await describe_alert(alert), alert.client)
+
+
+async def resolve_channels(client: TelegramClient, names, known: dict = None,
+                           cache: ChannelCache = None) -> dict:
+    """
+    Определяет chat_id каналов и возвращает словарь: имя канала -> chat_id
+    Уже известные каналы (known) и каналы из кэша (cache) повторно не запрашиваются,
+    остальные определяются параллельно
+    """
+    known = known or {}
+    peer_ids = {}
+    missing = []
+    for name in names:
+        peer_id = known.get(name)
+        if peer_id is None and cache is not None:
+            peer_id = cache.get(name)
+        if peer_id is not None:
+            peer_ids[name] = peer_id
+        else:
+            missing.append(name)
+    
+    # Ограничение параллельных запросов: сотни ResolveUsername разом приводят к FloodWait
+    semaphore = asyncio.Semaphore(max(1, config.RESOLVE_CONCURRENCY))
+    
+    async def resolve(name):
+        try:
+            # get_input_entity берет access_hash из файла сессии, если канал уже встречался
+            async with semaphore:
+                peer_id = get_peer_id(await client.get_input_entity(name))
+        except Exception as e:
+            log.warning("Не удалось получить entity канала, пропускаем", extra={"channel": name, "error": str(e)})
+            return
+        peer_ids[name] = peer_id
+        if cache is not None:
+            cache.update(name, peer_id)
+        log.info("Мониторинг канала", extra={"channel": name, "chat_id": peer_id})
+    
+    await asyncio.gather(*(resolve(name) for name in missing))
+    # Порядок каналов - как в конфиге
+    return {name: peer_ids[name] for name in names if name in peer_ids}
+
+
+def channel_username(name: str):
+    """Username из имени канала в конфиге (@name, name, t.me/name); None - канал задан ID"""
+    name = name.strip()
+    if name.lstrip("-").isdigit():
+        return None
+    return name.rsplit("/", 1)[-1].lstrip("@").lower() or None
+
+
+async def get_channel_entities(client: TelegramClient, peer_ids) -> dict:
+    """
+    Entity каналов по chat_id: пачками по 100 (один GetChannels на пачку, без ResolveUsername)
+    Каналы, которые не удалось получить, в результат не попадают
+    """
+    peer_ids = list(peer_ids)
+    entities = {}
+    for offset in range(0, len(peer_ids), 100):
+        chunk = peer_ids[offset:offset + 100]
+        try:
+            found = await client.get_entity(chunk)
+        except Exception:
+            # Одна ошибка отменяет всю пачку - запрашиваем ее каналы по одному
+            found = []
+            for peer_id in chunk:
+                try:
+                    found.append(await client.get_entity(peer_id))
+                except Exception as e:
+                    log.warning("Не удалось проверить канал", extra={"chat_id": peer_id, "error": str(e)})
+        for entity in found:
+            entities[get_peer_id(entity)] = entity
+    return entities
+
+
+async def verify_channels(client: TelegramClient, peer_ids: dict, cache: ChannelCache = None) -> dict:
+    """
+    Проверка каналов после запуска (не задерживает начало мониторинга):
+    запрашивает entity каналов по chat_id пачками и пишет в лог их названия.
+    Заново по username определяются только каналы, у которых username
+    больше не совпадает с конфигом (например, username перешел к другому каналу)
+    Возвращает каналы, chat_id которых изменился
+    """
+    entities = await get_channel_entities(client, peer_ids.values())
+    changed = {}
+    for name, peer_id in peer_ids.items():
+        entity = entities.get(peer_id)
+        username = channel_username(name)
+        if entity is not None and username is not None:
+            usernames = {entity.username} | {u.username for u in getattr(entity, 'usernames', None) or ()}
+            if username not in {u.lower() for u in usernames if u}:
+                entity = None
+        if entity is None:
+            try:
+                entity = await client.get_entity(name)
+            except Exception as e:
+                log.warning("Не удалось проверить канал", extra={"channel": name, "error": str(e)})
+                continue
+        actual_id = get_peer_id(entity)
+        if cache is not None:
+            cache.update(name, actual_id)
+        if actual_id != peer_id:
+            log.warning("chat_id канала изменился", extra={"channel": name, "old": peer_id, "new": actual_id})
+            changed[name] = actual_id
+        log.info(
+            "Мониторинг канала",
+            extra={"channel": name, "title": getattr(entity, 'title', None), "chat_id": actual_id}
         )
+    return changed
+
+
+async def recheck_channels(client: TelegramClient, routes: RouteTable, event_handlers: list,
+                           cache: ChannelCache):
+    """
+    Проверяет каналы, chat_id которых был взят из кэша, и переподписывает
+    обработчики, если chat_id какого-то канала изменился
+    """
+    current = {route.name: peer_id for peer_id, route in routes.routes.items()}
+    changed = await verify_channels(client, current, cache)
+    cache.save()
+    if changed:
+        new_routes = {changed.get(route.name, peer_id): route for peer_id, route in routes.routes.items()}
+        routes.swap(new_routes)
+        subscribe(client, event_handlers, new_routes)
+
+
+def log_startup_time(stage: str, started: float):
+    """Пишет в лог и в метрики время от запуска до этапа (connected, listening, first_event)"""
+    seconds = round(time.monotonic() - started, 3)
+    metrics.STARTUP_SECONDS.set(seconds, stage)
+    log.info("Время запуска", extra={"stage": stage, "seconds": seconds})
+
+
+def subscribe(client: TelegramClient, callbacks, chat_ids):
+    """
+    (Пере)регистрирует обработчики событий для списка чатов на работающем клиенте
+    callbacks - пары (обработчик, тип события), например (on_message, events.NewMessage)
+    """
+    chats = list(chat_ids)
+    for callback, event_type in callbacks:
+        client.remove_event_handler(callback)
+        client.add_event_handler(callback, event_type(chats=chats))
 
 
-async def main():
+def make_event_handlers(client: TelegramClient, routes: RouteTable, message_state: MessageState,
+                        started: float = None) -> list:
+    """
+    Обработчики событий Telethon для каналов из таблицы маршрутов
+    started - время запуска (time.monotonic()): по первому сообщению в лог пишется,
+    сколько прошло от запуска до начала приема сообщений
+    Возвращает пары (обработчик, тип события) для subscribe()
+    """
+    first_event = [started]
+    
+    async def message_handler(event):
+        route = routes.get(event.chat_id)
+        if route is None:
+            return
+        if first_event[0] is not None:
+            log_startup_time("first_event", first_event[0])
+            first_event[0] = None
+        message_state.update(event.chat_id, event.message.id, live=True)
+        if event.message.grouped_id:
+            # Часть альбома - весь альбом целиком обработает album_handler
+            return
+        await handler(event, route.name, client, route.matcher)
+    
+    async def album_handler(event):
+        route = routes.get(event.chat_id)
+        if route is None:
+            return
+        await handler(AlbumEvent(event), route.name, client, route.matcher)
+    
+    async def edit_handler(event):
+        route = routes.get(event.chat_id)
+        if route is None:
+            return
+        await handler(event, route.name, client, route.matcher, edited=True)
+    
+    event_handlers = [(message_handler, events.NewMessage), (album_handler, events.Album)]
+    if config.WATCH_EDITS:
+        event_handlers.append((edit_handler, events.MessageEdited))
+    return event_handlers
+
+
+def start_backfill(client: TelegramClient, routes: RouteTable, message_state: MessageState) -> asyncio.Task:
+    """Запускает догрузку сообщений, пропущенных пока бот был остановлен"""
+    async def process_missed(event):
+        route = routes.get(event.chat_id)
+        if route is not None:
+            await handler(event, route.name, client, route.matcher)
+            message_state.update(event.chat_id, event.message.id)
+    
+    return asyncio.create_task(backfill_channels(
+        client, list(routes), message_state, process_missed,
+        concurrency=config.BACKFILL_CONCURRENCY,
+        limit=config.BACKFILL_LIMIT
+    ), name="backfill")
+
+
+def restart_backfill(background_tasks: list, client: TelegramClient, routes: RouteTable,
+                     message_state: MessageState):
+    """Запускает догрузку после переподключения (предыдущая, если еще идет, отменяется)"""
+    for task in background_tasks:
+        if task.get_name() == "backfill" and not task.done():
+            task.cancel()
+    background_tasks.append(start_backfill(client, routes, message_state))
+
+
+def start_match_pool(routes: RouteTable, matcher: KeywordMatcher = None) -> MatchPool:
+    """Пул процессов с наборами ключевых слов всех каналов"""
+    matchers = [matcher or keyword_matcher] + [route.matcher for route in routes.routes.values()]
+    return MatchPool(matchers, workers=config.OFFLOAD_WORKERS, min_length=config.OFFLOAD_MIN_LENGTH)
+
+
+async def main(client_factory=TelegramClient):
     """
     Основная функция
+    client_factory - конструктор клиента Telegram (session, api_id, api_hash);
+    нагрузочный тест подставляет клиента без сети (см. scripts/load_test.py)
     """
-    print("🚀 Запуск Telegram Channel Monitor...")
+    log.info("Запуск Telegram Channel Monitor")
+    started = time.monotonic()
     
     # Проверяем наличие необходимых данных
     if not API_ID or not API_HASH:
-        print("❌ Ошибка: Не указаны API_ID и/или API_HASH в .env файле")
+        log.error("Не указаны API_ID и/или API_HASH в .env файле")
         return
     
-    if not CHANNEL_NAME or CHANNEL_NAME == "your_channel_name_here":
-        print("❌ Ошибка: Не указан CHANNEL_NAME в .env файле или config.py")
+    channels = load_channels(CHANNEL_NAME)
+    if not channels:
+        log.error("Не указан CHANNEL_NAME в .env файле или CHANNELS в config.py")
         return
     
     # Инициализируем клиент для мониторинга (user account)
     # Используем абсолютный путь для файла сессии, чтобы избежать конфликтов
     import pathlib
     session_path = pathlib.Path('telegram_monitor.session').absolute()
-    client = TelegramClient(str(session_path), API_ID, API_HASH)
+    client = client_factory(str(session_path), API_ID, API_HASH)
     
     # Инициализируем бота для отправки уведомлений (если указан токен)
-    bot_client = None
-    if BOT_TOKEN:
+    async def start_bot_client():
+        if not BOT_TOKEN:
+            return None
         try:
             bot_session_path = pathlib.Path('telegram_bot.session').absolute()
-            bot_client = TelegramClient(str(bot_session_path), API_ID, API_HASH)
+            bot_client = client_factory(str(bot_session_path), API_ID, API_HASH)
             # Для бота используем токен вместо user account
             await bot_client.start(bot_token=BOT_TOKEN)
-            print("✅ Бот подключен для отправки уведомлений")
-            # Сохраняем bot_client в глобальном контексте для использования в handler
-            handler.bot_client = bot_client
         except Exception as e:
-            print(f"⚠️  Предупреждение: Не удалось подключить бота: {e}")
-            print(f"   Уведомления будут отправляться от вашего аккаунта")
+            log.warning(
+                "Не удалось подключить бота, уведомления будут отправляться от вашего аккаунта",
+                extra={"error": str(e)}
+            )
+            return None
+        log.info("Бот подключен для отправки уведомлений")
+        # Сохраняем bot_client в глобальном контексте для использования в handler
+        handler.bot_client = bot_client
+        return bot_client
     
     # Подключаемся к Telegram с обработкой ошибок блокировки
+    # Бот и основной клиент подключаются параллельно
     try:
-        await client.start()
-        print("✅ Подключение к Telegram установлено")
+        bot_client, _ = await asyncio.gather(start_bot_client(), client.start())
+        log.info("Подключение к Telegram установлено")
     except Exception as e:
         if "database is locked" in str(e).lower() or "locked" in str(e).lower():
-            print("❌ Ошибка: Файл сессии заблокирован")
-            print("   Возможно, другой процесс использует этот файл сессии")
-            print("   Решение:")
-            print("   1. Остановите все процессы бота: sudo systemctl stop telegram-monitor.service")
-            print("   2. Удалите файлы блокировки: rm -f *.session-journal")
-            print("   3. Запустите скрипт исправления: bash fix_session_lock.sh")
+            log.error(
+                "Файл сессии заблокирован: возможно, другой процесс использует этот файл сессии. "
+                "Остановите все процессы бота (sudo systemctl stop telegram-monitor.service), "
+                "удалите файлы блокировки (rm -f *.session-journal) "
+                "или запустите скрипт исправления (bash fix_session_lock.sh)"
+            )
             return
         else:
             raise
+    log_startup_time("connected", started)
     
-    # Регистрируем обработчик событий ПОСЛЕ подключения
-    # Используем entity вместо строки для более надежной работы
-    try:
-        channel_entity = await client.get_entity(CHANNEL_NAME)
-        print(f"📡 Регистрирую обработчик для канала: {CHANNEL_NAME} (ID: {channel_entity.id})")
+    # Определяем chat_id всех каналов и строим таблицу маршрутов chat_id -> канал
+    # Каналы из кэша не запрашиваются: их проверка выполняется уже после подписки
+    channel_cache = ChannelCache(pathlib.Path('entity_cache.json').absolute())
+    channel_cache.load()
+    peer_ids = await resolve_channels(client, channels, cache=channel_cache)
+    if not peer_ids:
+        log.error("Не удалось получить ни один канал для мониторинга")
+        return
+    channel_cache.save()
+    
+    routes = RouteTable(build_routes(peer_ids, channels, keyword_matcher))
+    
+    # ID последних обработанных сообщений (для догрузки пропущенных после перезапуска)
+    message_state = MessageState(pathlib.Path('monitor_state.json').absolute())
+    message_state.load()
+    if config.BACKFILL_ENABLED:
+        # До подписки: живые сообщения не должны сдвинуть начало догрузки
+        message_state.mark_gaps()
+    
+    # Отпечатки уже найденных сообщений (для отсева пересылок и репостов)
+    dedup = None
+    if config.DEDUP_ENABLED:
+        dedup = DedupStore(
+            pathlib.Path('dedup_state.bin').absolute(),
+            max_entries=config.DEDUP_MAX_ENTRIES,
+            ttl=config.DEDUP_TTL
+        )
+        dedup.load()
+        handler.dedup = dedup
+    
+    # Версии недавних сообщений, чтобы при редактировании уведомлять только о новых совпадениях
+    handler.edits = EditTracker(config.EDIT_TRACK_MAX)
+    
+    # Архив сообщений для поиска (scripts/archive_search.py)
+    archive = start_archive() if config.ARCHIVE_ENABLED else None
+    
+    if not NOTIFY_CHAT_ID:
+        log.info("NOTIFY_CHAT_ID не указан - уведомления будут только в лог")
+    
+    # В режиме дайджеста совпадения копятся и отправляются одним сообщением
+    digest = None
+    if config.DIGEST_MODE and NOTIFY_CHAT_ID:
+        async def send_digest(text):
+            await send_notification(client, text, getattr(handler, 'bot_client', None))
         
-        @client.on(events.NewMessage(chats=channel_entity))
-        async def message_handler(event):
-            await handler(event, CHANNEL_NAME, client)
-    except Exception as e:
-        print(f"⚠️  Предупреждение: Не удалось получить entity канала, используем строку: {e}")
-        @client.on(events.NewMessage(chats=CHANNEL_NAME))
-        async def message_handler(event):
-            await handler(event, CHANNEL_NAME, client)
+        digest = DigestBuffer(
+            send_digest,
+            window=config.DIGEST_WINDOW,
+            max_alerts=config.DIGEST_MAX_ALERTS
+        )
+        handler.digest = digest
+        log.info(
+            "Режим дайджеста",
+            extra={"window": config.DIGEST_WINDOW, "max_alerts": config.DIGEST_MAX_ALERTS}
+        )
     
-    # Получаем информацию о канале
-    try:
-        entity = await client.get_entity(CHANNEL_NAME)
-        if isinstance(entity, Channel):
-            print(f"📺 Мониторинг канала: {entity.title}")
-            print(f"👁️  Подписчиков: {entity.participants_count if hasattr(entity, 'participants_count') else 'N/A'}")
-        else:
-            print(f"📺 Мониторинг: {CHANNEL_NAME}")
-    except Exception as e:
-        print(f"⚠️  Предупреждение: Не удалось получить информацию о канале: {e}")
-        print(f"📺 Продолжаем мониторинг: {CHANNEL_NAME}")
+    # Запускаем воркеры очереди уведомлений
+    # Когда очередь отправлена при остановке, дайджест отправляется сразу;
+    # с DIGEST_FLUSH_ON_IDLE - и каждый раз, когда очередь опустела
+    queue = NotificationQueue(
+        deliver_alert,
+        maxsize=config.NOTIFY_QUEUE_SIZE,
+        workers=config.NOTIFY_WORKERS,
+        on_drain=digest.flush if digest else None,
+        on_idle=digest.flush if digest and config.DIGEST_FLUSH_ON_IDLE else None
+    )
+    queue.start()
+    handler.queue = queue
+    metrics.NOTIFY_QUEUE_DEPTH.function = lambda: queue.depth
     
-    print(f"🔍 Ищем ключевые слова: {', '.join(config.KEYWORDS)}")
+    # Журнал уведомлений: неотправленные в прошлый раз уведомления отправляются первыми
+    outbox = start_outbox(client) if config.OUTBOX_ENABLED else None
     
-    # Проверяем настройку уведомлений
-    if NOTIFY_CHAT_ID:
+    # Пул процессов для поиска по длинным сообщениям (процессы запускаются в фоне)
+    if config.OFFLOAD_WORKERS:
+        handler.match_pool = start_match_pool(routes)
+    
+    # Регистрируем один обработчик на все каналы ПОСЛЕ подключения
+    # Канал и его ключевые слова определяются по chat_id за O(1)
+    log.info("Регистрирую обработчик для каналов", extra={"channels": len(routes)})
+    event_handlers = make_event_handlers(client, routes, message_state, started=started)
+    subscribe(client, event_handlers, routes)
+    log.info("Ищем ключевые слова", extra={"keywords": len(keyword_matcher)})
+    log_startup_time("listening", started)
+    
+    async def deferred_checks():
+        """Проверки, без которых можно принимать сообщения: выполняются после подписки"""
+        # Снимок списка: во время await конфиг может быть перезагружен
+        for destination in list(notify_router):
+            send_client, sender = get_sender(destination, client, bot_client)
+            target = destination.target
+            try:
+                # Определяем чат для уведомлений один раз и кэшируем его
+                await target.resolve(send_client)
+                log.info(
+                    "Уведомления будут отправляться в чат",
+                    extra={"destination": destination.name or "default", "sender": sender,
+                           "chat_id": target.resolved_id or target.chat_id}
+                )
+            except Exception as e:
+                log.warning(
+                    "Не удалось проверить чат для уведомлений, уведомления в Telegram могут не работать. "
+                    "Проверьте NOTIFY_CHAT_ID в .env и DESTINATIONS в config.py",
+                    extra={"destination": destination.name or "default", "chat_id": target.chat_id, "error": str(e)}
+                )
+        
+        pool = getattr(handler, 'match_pool', None)
+        if pool is not None:
+            await pool.warm_up()
+            log.info(
+                "Длинные сообщения проверяются в пуле процессов",
+                extra={"workers": config.OFFLOAD_WORKERS, "min_length": config.OFFLOAD_MIN_LENGTH}
+            )
+        
+        await recheck_channels(client, routes, event_handlers, channel_cache)
+    
+    background_tasks = [asyncio.create_task(deferred_checks()), asyncio.create_task(message_state.autosave())]
+    if dedup is not None:
+        background_tasks.append(asyncio.create_task(dedup.autosave()))
+    if archive is not None:
+        background_tasks.append(asyncio.create_task(archive.autoflush()))
+    
+    # Перезагрузка ключевых слов и каналов по SIGHUP или при изменении config.py/.env
+    async def reload_config():
+        global keyword_matcher, notify_router, CHANNEL_NAME
+        importlib.reload(config)
+        load_dotenv(dotenv_path=env_path, override=True)
+        channel_name = os.getenv('CHANNEL_NAME', config.CHANNEL_NAME)
+        new_channels = load_channels(channel_name)
+        if not new_channels:
+            raise ValueError("список каналов пуст")
+        
+        # Все тяжелые операции (компиляция, запросы entity) выполняются до замены
+        new_matcher = build_matcher()
+        new_router = build_router()
+        known = {route.name: peer_id for peer_id, route in routes.routes.items()}
+        new_peer_ids = await resolve_channels(client, new_channels, known, channel_cache)
+        if not new_peer_ids:
+            raise ValueError("не удалось получить ни один канал")
+        new_routes = build_routes(new_peer_ids, new_channels, new_matcher)
+        
+        old_pool = getattr(handler, 'match_pool', None)
+        new_pool = None
+        if old_pool is not None:
+            new_pool = start_match_pool(RouteTable(new_routes), new_matcher)
+            await new_pool.warm_up()
+        
+        # Атомарная замена: обработчик видит либо старые, либо новые настройки
+        keyword_matcher = new_matcher
+        notify_router = new_router
+        CHANNEL_NAME = channel_name
+        old_routes = routes.swap(new_routes)
+        if new_pool is not None:
+            handler.match_pool = new_pool
+            old_pool.close()
+        if set(old_routes) != set(new_routes):
+            subscribe(client, event_handlers, new_routes)
+        log.info(
+            "Конфигурация перезагружена",
+            extra={
+                "channels": len(new_routes),
+                "added": len(set(new_routes) - set(old_routes)),
+                "removed": len(set(old_routes) - set(new_routes)),
+                "keywords": len(new_matcher),
+            }
+        )
+    
+    watcher = ConfigWatcher(
+        [pathlib.Path(config.__file__), env_path],
+        reload_config,
+        interval=config.CONFIG_WATCH_INTERVAL
+    )
+    watcher.start()
+    
+    # Метрики для Prometheus (задержка event loop, переподключения и т.д.)
+    metrics_server = None
+    if config.METRICS_PORT:
         try:
-            # Проверяем доступность чата для уведомлений
-            await client.get_entity(int(NOTIFY_CHAT_ID))
-            print(f"✅ Уведомления будут отправляться в чат: {NOTIFY_CHAT_ID}")
-        except Exception as e:
-            print(f"⚠️  Предупреждение: Не удалось проверить чат для уведомлений ({NOTIFY_CHAT_ID}): {e}")
-            print(f"   Уведомления в Telegram могут не работать. Проверьте NOTIFY_CHAT_ID в .env")
-    else:
-        print("ℹ️  NOTIFY_CHAT_ID не указан - уведомления будут только в консоль")
-        print("   Для получения уведомлений в Telegram укажите NOTIFY_CHAT_ID в .env")
+            metrics_server = await metrics.start_server(config.METRICS_HOST, config.METRICS_PORT)
+        except OSError as e:
+            log.warning("Не удалось запустить сервер метрик", extra={"port": config.METRICS_PORT, "error": str(e)})
+        background_tasks.append(asyncio.create_task(metrics.monitor_loop(client)))
     
-    print("⏳ Ожидание новых сообщений... (Ctrl+C для остановки)\n")
+    # Догружаем сообщения, пропущенные пока бот был остановлен
+    if config.BACKFILL_ENABLED:
+        background_tasks.append(start_backfill(client, routes, message_state))
     
-    # Запускаем мониторинг с автоматическим переподключением
+    # Начало догрузки запоминается при обрыве: после переподключения catch_up()
+    # и живые сообщения сдвигают last_ids еще до запуска догрузки
+    def on_disconnect():
+        message_state.reset_live()
+        if config.BACKFILL_ENABLED:
+            message_state.mark_gaps()
+    
+    # После переподключения догружаем сообщения, пропущенные за время обрыва
+    async def on_reconnect():
+        if config.BACKFILL_ENABLED:
+            restart_backfill(background_tasks, client, routes, message_state)
+    
+    # Бот переподключается сам по себе: уведомления, не отправленные за время обрыва, повторит outbox
+    if bot_client is not None:
+        background_tasks.append(asyncio.create_task(run_until_stopped(
+            bot_client, "bot",
+            initial_delay=config.RECONNECT_INITIAL_DELAY,
+            max_delay=config.RECONNECT_MAX_DELAY
+        )))
+    
+    log.info("Ожидание новых сообщений (Ctrl+C для остановки)")
+    
+    # Запускаем мониторинг с переподключением без перезапуска процесса:
+    # ключевые слова, кэши и очереди остаются в памяти
     try:
-        await client.run_until_disconnected()
-    except (ConnectionError, OSError) as e:
-        print(f"\n⚠️  Соединение разорвано: {e}")
-        print("   Systemd автоматически перезапустит сервис")
-        raise  # Поднимаем исключение, чтобы systemd перезапустил сервис
+        await run_until_stopped(
+            client, "user",
+            on_disconnect=on_disconnect,
+            on_reconnect=on_reconnect,
+            initial_delay=config.RECONNECT_INITIAL_DELAY,
+            max_delay=config.RECONNECT_MAX_DELAY
+        )
     except Exception as e:
-        error_msg = str(e).lower()
-        if "connection" in error_msg or "reset" in error_msg or "peer" in error_msg:
-            print(f"\n⚠️  Проблема с соединением: {e}")
-            print("   Systemd автоматически перезапустит сервис")
+        # Например, сессия перестала быть авторизованной - перезапуск выполнит systemd
+        log.warning("Мониторинг остановлен, systemd автоматически перезапустит сервис", extra={"error": str(e)})
         raise
+    finally:
+        watcher.stop()
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        if metrics_server is not None:
+            metrics_server.close()
+        # Отправляем уведомления, которые остались в очереди
+        handler.queue = None
+        await queue.stop()
+        if outbox is not None:
+            await outbox.stop()
+            handler.outbox = None
+        if getattr(handler, 'match_pool', None) is not None:
+            handler.match_pool.close()
+            handler.match_pool = None
+        message_state.save()
+        channel_cache.save()
+        if archive is not None:
+            handler.archive = None
+            await archive.close()
+        if dedup is not None:
+            dedup.save()
 
 
 if __name__ == "__main__":
+    setup_logging(
+        level=config.LOG_LEVEL,
+        fmt=config.LOG_FORMAT,
+        burst=config.LOG_RATE_LIMIT,
+        interval=config.LOG_RATE_INTERVAL
+    )
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
-        print("\n\n👋 Мониторинг остановлен пользователем")
+        log.info("Мониторинг остановлен пользователем")
     except Exception as e:
         error_msg = str(e).lower()
         if "database is locked" in error_msg or "locked" in error_msg:
-            print(f"\n❌ Ошибка: Файл сессии заблокирован")
-            print(f"   Выполните на сервере: bash fix_session_lock.sh")
+            log.error("Файл сессии заблокирован. Выполните на сервере: bash fix_session_lock.sh")
         else:
-            print(f"\n❌ Ошибка: {e}")
+            log.error("Ошибка", extra={"error": str(e)})
 
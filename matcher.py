@@ -0,0 +1,240 @@
+"""
+Мультишаблонный поиск ключевых фраз (автомат Ахо-Корасик)
+Автомат строится один раз при запуске (или при перезагрузке ключевых слов),
+после чего каждый текст просматривается за один проход независимо от числа фраз
+
+WordMatcher - поиск целых слов (с учетом форм слова через stemmer.py)
+по хэш-индексу основ, построенному заранее
+"""
+
+import re
+from collections import deque
+from typing import Callable, Dict, Iterable, List, NamedTuple, Tuple, Union
+
+from normalize import NormalizedText, Normalizer
+
+# До этого числа ключевых слов поиск подстроки через `in` (реализован на C)
+# быстрее прохода автомата на Python, см. scripts/bench_matcher.py
+SMALL_SET_LIMIT = 300
+
+
+class Hit(NamedTuple):
+    """Одно вхождение ключевой фразы в тексте"""
+    keyword: str   # Ключевое слово в том виде, как оно задано в конфиге
+    start: int     # Позиция начала вхождения в тексте
+    end: int       # Позиция сразу после конца вхождения
+
+
+class _BaseMatcher:
+    """Общая часть: список ключевых слов и подготовка текста к поиску"""
+
+    def __init__(self, keywords: Iterable[str], case_insensitive: bool = True,
+                 normalizer: Normalizer = None):
+        self.case_insensitive = case_insensitive
+        # Если задан normalizer, ключевые слова и текст приводятся к единой
+        # нормализованной форме (см. normalize.py) вместо простого lower()
+        self.normalizer = normalizer
+        self.keywords: List[str] = list(keywords)
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    def _prepare(self, text: str) -> str:
+        if self.normalizer is not None:
+            return self.normalizer.fold(text)
+        text = text.strip() if text else ""
+        return text.lower() if self.case_insensitive else text
+
+    def normalize(self, text: str) -> NormalizedText:
+        """
+        Нормализует текст один раз, чтобы передавать результат в match/find_all
+        (без normalizer возвращает текст в нижнем регистре без карты позиций)
+        """
+        if self.normalizer is not None:
+            return self.normalizer.normalize(text)
+        return NormalizedText(text or "", self._prepare_text(text or ""), None)
+
+    def _prepare_text(self, text: Union[str, NormalizedText]) -> str:
+        if isinstance(text, NormalizedText):
+            # Текст уже нормализован (один раз на сообщение)
+            return text.text
+        if self.normalizer is not None:
+            return self.normalizer.fold(text)
+        # Текст не обрезаем, чтобы позиции совпадали с исходным сообщением
+        return text.lower() if self.case_insensitive else text
+
+
+class KeywordMatcher(_BaseMatcher):
+    """
+    Скомпилированный набор ключевых фраз
+    Возвращает все вхождения с позициями за один проход по тексту
+    """
+
+    def __init__(self, keywords: Iterable[str], case_insensitive: bool = True,
+                 normalizer: Normalizer = None):
+        super().__init__(keywords, case_insensitive, normalizer)
+
+        # Узлы бора: переходы, суффиксная ссылка, выходы (индексы ключевых слов)
+        self._goto: List[dict] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[tuple] = [()]
+        self._lengths: List[int] = []
+        self._patterns: List[str] = []
+
+        outputs: List[list] = [[]]
+        for index, keyword in enumerate(self.keywords):
+            pattern = self._prepare(keyword)
+            self._patterns.append(pattern)
+            self._lengths.append(len(pattern))
+            if not pattern:
+                # Пустые ключевые слова никогда не совпадают (как и раньше)
+                continue
+            state = 0
+            for ch in pattern:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    outputs.append([])
+                state = nxt
+            outputs[state].append(index)
+
+        # Строим суффиксные ссылки обходом в ширину и сливаем выходы по ним,
+        # чтобы при поиске не ходить по цепочке ссылок за каждым совпадением
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                candidate = self._goto[fail].get(ch, 0)
+                self._fail[nxt] = candidate if candidate != nxt else 0
+                outputs[nxt].extend(outputs[self._fail[nxt]])
+
+        self._out = [tuple(sorted(out)) for out in outputs]
+
+    def _scan(self, text: str):
+        """Генерирует пары (позиция конца, индексы ключевых слов)"""
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        root = goto[0]
+        state = 0
+        for pos, ch in enumerate(text):
+            if state == 0:
+                state = root.get(ch, 0)
+            else:
+                nxt = goto[state].get(ch)
+                while nxt is None and state:
+                    state = fail[state]
+                    nxt = goto[state].get(ch)
+                state = nxt or 0
+            if out[state]:
+                yield pos + 1, out[state]
+
+    def find_all(self, text: Union[str, NormalizedText]) -> List[Hit]:
+        """
+        Возвращает все вхождения ключевых фраз (включая перекрывающиеся)
+        в порядке их появления в тексте
+        Для NormalizedText позиции относятся к нормализованному тексту
+        """
+        if not text:
+            return []
+        hits = []
+        lengths = self._lengths
+        for end, indexes in self._scan(self._prepare_text(text)):
+            for index in indexes:
+                hits.append(Hit(self.keywords[index], end - lengths[index], end))
+        return hits
+
+    def match(self, text: Union[str, NormalizedText]) -> List[str]:
+        """
+        Возвращает список найденных ключевых слов без повторов
+        в порядке, в котором они заданы в конфиге
+        """
+        if not text:
+            return []
+        text = self._prepare_text(text)
+        if len(self._patterns) <= SMALL_SET_LIMIT:
+            return [keyword for keyword, pattern in zip(self.keywords, self._patterns)
+                    if pattern and pattern in text]
+        found = set()
+        for _, indexes in self._scan(text):
+            found.update(indexes)
+        return [self.keywords[index] for index in sorted(found)]
+
+
+# Слово: буквы и цифры, внутри слова допускается апостроф ("з'їзд", "п’ять")
+WORD_RE = re.compile(r"\w+(?:['’ʼ]\w+)*")
+
+
+class WordMatcher(_BaseMatcher):
+    """
+    Поиск ключевых фраз только целыми словами
+    Каждая фраза разбивается на слова и приводится к основам функцией stem
+    (без stem - точное совпадение слов). Основы первых слов фраз хранятся
+    в словаре, поэтому текст проверяется за один проход по его словам:
+    O(число слов) независимо от числа ключевых фраз
+    """
+
+    def __init__(self, keywords: Iterable[str], case_insensitive: bool = True,
+                 normalizer: Normalizer = None, stem: Callable[[str], str] = None):
+        super().__init__(keywords, case_insensitive, normalizer)
+        self.stem = stem
+        # Основа первого слова -> [(индекс ключевого слова, основы всех его слов)]
+        self._index: Dict[str, List[Tuple[int, Tuple[str, ...]]]] = {}
+        # Число слов в каждой фразе
+        self._lengths: List[int] = []
+        for index, keyword in enumerate(self.keywords):
+            stems = tuple(self._stems(WORD_RE.findall(self._prepare(keyword))))
+            self._lengths.append(len(stems))
+            if not stems:
+                # Фразы без слов никогда не совпадают
+                continue
+            self._index.setdefault(stems[0], []).append((index, stems))
+
+    def _stems(self, words: List[str]) -> List[str]:
+        if self.stem is None:
+            return words
+        return list(map(self.stem, words))
+
+    def _lookup(self, stems: List[str]):
+        """Генерирует пары (номер первого слова в тексте, индекс ключевого слова)"""
+        get = self._index.get
+        for position, word_stem in enumerate(stems):
+            candidates = get(word_stem)
+            if candidates is None:
+                continue
+            for index, phrase in candidates:
+                if len(phrase) == 1 or tuple(stems[position:position + len(phrase)]) == phrase:
+                    yield position, index
+
+    def find_all(self, text: Union[str, NormalizedText]) -> List[Hit]:
+        """
+        Возвращает все вхождения ключевых фраз в порядке их появления в тексте
+        Позиции охватывают слова фразы целиком (в той форме, как они написаны)
+        """
+        if not text:
+            return []
+        words = list(WORD_RE.finditer(self._prepare_text(text)))
+        stems = self._stems([word.group() for word in words])
+        hits = []
+        for position, index in self._lookup(stems):
+            last = words[position + self._lengths[index] - 1]
+            hits.append(Hit(self.keywords[index], words[position].start(), last.end()))
+        return hits
+
+    def match(self, text: Union[str, NormalizedText]) -> List[str]:
+        """
+        Возвращает список найденных ключевых слов без повторов
+        в порядке, в котором они заданы в конфиге
+        """
+        if not text:
+            return []
+        stems = self._stems(WORD_RE.findall(self._prepare_text(text)))
+        found = {index for _, index in self._lookup(stems)}
+        return [self.keywords[index] for index in sorted(found)]
@@ -0,0 +1,221 @@
+"""
+Метрики процесса в формате Prometheus (text exposition)
+Реализация без внешних зависимостей: счетчики, показатели и гистограммы
+с метками, а также небольшой HTTP-сервер на asyncio, отдающий /metrics
+Обновление метрики - одна операция со словарем, поэтому их можно
+держать включенными в production
+"""
+
+import asyncio
+import bisect
+import time
+from typing import Callable, Dict, List, Tuple
+
+from log import get_logger
+
+log = get_logger("metrics")
+
+# Границы гистограмм задержек (секунды)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        _registry.append(self)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0.0)
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.label_names, labels)} {value}"
+                for labels, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """Показатель, который может расти и уменьшаться (или вычисляться функцией)"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+                 function: Callable[[], float] = None):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[tuple, float] = {}
+        self.function = function
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+    def _samples(self) -> List[str]:
+        if self.function is not None:
+            return [f"{self.name} {self.function()}"]
+        return [f"{self.name}{_format_labels(self.label_names, labels)} {value}"
+                for labels, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    """Гистограмма значений (обычно задержек в секундах)"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # метки -> [счетчики по корзинам (+Inf последней), сумма, количество]
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        data = self._values.get(labels)
+        if data is None:
+            data = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        data[0][bisect.bisect_left(self.buckets, value)] += 1
+        data[1] += value
+        data[2] += 1
+
+    def time(self, *labels):
+        """Контекстный менеджер: замеряет время выполнения блока"""
+        return _Timer(self, labels)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for labels, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels(self.label_names, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+
+def render() -> str:
+    """Все метрики в текстовом формате Prometheus"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Метрики монитора
+MESSAGES_RECEIVED = Counter("monitor_messages_received_total", "Сообщений получено", ("channel",))
+KEYWORD_MATCHES = Counter("monitor_keyword_matches_total", "Совпадений по ключевым словам", ("keyword",))
+OFFLOADED_MATCHES = Counter("monitor_offloaded_matches_total", "Сообщений, проверенных в пуле процессов")
+MATCH_LATENCY = Histogram("monitor_check_keywords_seconds", "Время поиска ключевых слов в сообщении")
+DUPLICATES_DROPPED = Counter("monitor_duplicates_dropped_total", "Повторов отсеяно без уведомления", ("channel",))
+SEND_LATENCY = Histogram("monitor_notification_send_seconds", "Время отправки уведомления в Telegram")
+SEND_FAILURES = Counter("monitor_notification_failures_total", "Ошибок отправки уведомлений", ("reason",))
+RATE_LIMIT_WAIT_SECONDS = Counter("monitor_rate_limit_wait_seconds_total", "Ожидание ограничителя скорости отправки, секунды", ("destination",))
+FLOOD_WAIT_SECONDS = Counter("monitor_flood_wait_seconds_total", "Суммарное время FloodWait, секунды")
+STARTUP_SECONDS = Gauge("monitor_startup_seconds", "Время от запуска до этапа (connected, listening, first_event)", ("stage",))
+RECONNECTS = Counter("monitor_reconnects_total", "Переподключений к Telegram")
+RECONNECT_SECONDS = Histogram("monitor_reconnect_seconds", "Время без соединения до переподключения (reconnect.py)",
+                              ("client",), buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0))
+RECONNECT_ATTEMPTS = Counter("monitor_reconnect_failed_attempts_total", "Неудачных попыток переподключения", ("client",))
+DISCONNECTED = Gauge("monitor_disconnected", "1 - соединение потеряно и идет переподключение", ("client",))
+LOOP_LAG = Histogram("monitor_event_loop_lag_seconds", "Задержка event loop")
+LOOP_LAG_LAST = Gauge("monitor_event_loop_lag_last_seconds", "Последняя измеренная задержка event loop")
+# Значение задается функцией после создания очереди уведомлений
+OUTBOX_PENDING = Gauge("monitor_outbox_pending", "Неотправленных уведомлений в outbox", function=lambda: 0)
+NOTIFY_QUEUE_DEPTH = Gauge("monitor_notify_queue_depth", "Уведомлений в очереди", function=lambda: 0)
+
+
+async def monitor_loop(client=None, interval: float = 1.0):
+    """
+    Измеряет задержку event loop (насколько позже запланированного
+    просыпается sleep) и считает переподключения клиента
+    """
+    loop = asyncio.get_running_loop()
+    was_connected = client.is_connected() if client is not None else None
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - started - interval)
+        LOOP_LAG.observe(lag)
+        LOOP_LAG_LAST.set(lag)
+        if client is not None:
+            connected = client.is_connected()
+            if connected and was_connected is False:
+                RECONNECTS.inc()
+            was_connected = connected
+
+
+async def _handle_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        # Остальные заголовки запроса не нужны, но их нужно прочитать
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request_line.decode("latin-1").split()
+        path = parts[1].split("?")[0] if len(parts) > 1 else ""
+        if path == "/metrics":
+            status, body = "200 OK", render().encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            status, body, content_type = "404 Not Found", b"not found\n", "text/plain"
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body)
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_server(host: str = "127.0.0.1", port: int = 9108):
+    """Запускает HTTP-сервер метрик (GET /metrics)"""
+    server = await asyncio.start_server(_handle_request, host, port)
+    log.info("Метрики доступны", extra={"url": f"http://{host}:{port}/metrics"})
+    return server
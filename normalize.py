@@ -0,0 +1,195 @@
+"""
+Нормализация текста перед поиском ключевых слов
+Выполняется один раз на сообщение и включает:
+- Unicode NFKC (полноширинные символы, лигатуры и т.п.)
+- casefold (если поиск без учета регистра)
+- замену латинских букв, похожих на кириллические (a -> а, o -> о, ...), и ё -> е
+- удаление невидимых символов (zero-width, мягкий перенос, знаки ударения)
+- склейку переносов слов ("шля-\\nхова" -> "шляхова") и схлопывание пробелов
+
+Посимвольные преобразования табличные (str.translate), таблица заполняется
+по мере появления новых символов и дальше используется повторно
+"""
+
+import re
+import unicodedata
+from typing import List, Optional, Tuple
+
+# Латинские (и другие) буквы, похожие на кириллические, и варианты написания
+HOMOGLYPHS = {
+    "A": "А", "B": "В", "C": "С", "E": "Е", "H": "Н", "K": "К", "M": "М",
+    "O": "О", "P": "Р", "T": "Т", "X": "Х", "Y": "У", "I": "І",
+    "a": "а", "c": "с", "e": "е", "o": "о", "p": "р", "x": "х", "y": "у", "i": "і",
+    "k": "к", "m": "м",
+    "Ё": "Е", "ё": "е", "Ë": "Е", "ë": "е", "Ґ": "Г", "ґ": "г",
+}
+
+# Символы, которые удаляются полностью
+INVISIBLE = {"\u00ad", "\u200b", "\u200c", "\u200d", "\u2060", "\ufeff"}
+
+# Перенос слова: буква, дефис, перевод строки, буква
+_HYPHENATION_RE = re.compile(r"(?<=\w)-[^\S\n]*\n\s*(?=\w)")
+_SPACES_RE = re.compile(r"\s+")
+
+# Символы, которые таблица не меняет (кроме регистра и пробелов): ASCII-пунктуация,
+# цифры, пробельные символы и кириллица без ё/ґ. Через таблицу пропускаются только
+# участки текста из остальных символов, а для всего текста хватает casefold() на C
+_NEEDS_TABLE_RE = re.compile(
+    r"[^\x20-\x40\x5b-\x60\x7b-\x7e\s\u0410-\u044f\u0404\u0406\u0407\u0454\u0456\u0457]+"
+)
+
+
+class _FoldTable(dict):
+    """
+    Таблица для str.translate: код символа -> нормализованная строка
+    Отсутствующие символы вычисляются один раз при первом появлении
+    """
+
+    def __init__(self, casefold: bool):
+        super().__init__()
+        self.casefold = casefold
+
+    def __missing__(self, code: int) -> str:
+        char = chr(code)
+        if char == "\n":
+            # Перевод строки сохраняем до склейки переносов
+            folded = "\n"
+        elif char.isspace():
+            folded = " "
+        elif char in INVISIBLE or unicodedata.category(char) in ("Mn", "Cf"):
+            folded = ""
+        else:
+            folded = unicodedata.normalize("NFKC", char)
+            # Сначала регистр, потом замена похожих букв: у B, H, T кириллический
+            # двойник только у заглавной, и иначе "Bitcoin" и "bitcoin" разошлись бы
+            if self.casefold:
+                folded = folded.casefold()
+            folded = "".join(HOMOGLYPHS.get(c, c) for c in folded)
+        self[code] = folded
+        return folded
+
+
+class NormalizedText:
+    """
+    Нормализованный текст сообщения и карта позиций в исходный текст
+    Карта строится только при обращении к ней (нужна лишь для совпадений)
+    """
+
+    __slots__ = ("original", "text", "_normalizer", "_offsets")
+
+    def __init__(self, original: str, text: str, normalizer: "Normalizer", offsets: List[int] = None):
+        self.original = original
+        self.text = text
+        self._normalizer = normalizer
+        self._offsets: Optional[List[int]] = offsets
+
+    @property
+    def offsets(self) -> List[int]:
+        """offsets[i] - позиция в исходном тексте для i-го символа нормализованного"""
+        if self._offsets is None:
+            if self._normalizer is None:
+                # Текст только переведен в нижний регистр - позиции совпадают
+                self._offsets = list(range(len(self.text)))
+            else:
+                _, self._offsets = self._normalizer._apply(self._normalizer._source(self.original), True)
+        return self._offsets
+
+    def original_span(self, start: int, end: int) -> Tuple[int, int]:
+        """Переводит позиции [start, end) нормализованного текста в позиции исходного"""
+        offsets = self.offsets
+        if not offsets or start >= end:
+            return 0, 0
+        return offsets[start], offsets[min(end, len(offsets)) - 1] + 1
+
+    def original_fragment(self, start: int, end: int) -> str:
+        """Фрагмент исходного текста, соответствующий [start, end) нормализованного"""
+        begin, finish = self.original_span(start, end)
+        return self.original[begin:finish]
+
+    def find_original(self, phrase: str) -> Optional[str]:
+        """
+        Ищет фразу в нормализованном тексте и возвращает соответствующий
+        фрагмент исходного текста (как он был написан в сообщении)
+        """
+        if self._normalizer is not None:
+            phrase = self._normalizer.fold(phrase)
+        else:
+            phrase = phrase.strip().lower()
+        start = self.text.find(phrase) if phrase else -1
+        if start < 0:
+            return None
+        return self.original_fragment(start, start + len(phrase))
+
+
+class Normalizer:
+    """Нормализация текста; casefold=False сохраняет регистр"""
+
+    def __init__(self, casefold: bool = True):
+        self.casefold = casefold
+        self._table = _FoldTable(casefold)
+
+    @staticmethod
+    def _source(text: str) -> str:
+        # Составные символы (е + U+0308) собираем до посимвольной таблицы.
+        # Позиции при этом относятся к тексту в форме NFC (обычно он и так в ней)
+        if not unicodedata.is_normalized("NFC", text):
+            text = unicodedata.normalize("NFC", text)
+        return text
+
+    def _fold_run(self, match: re.Match) -> str:
+        return match.group().translate(self._table)
+
+    def _apply(self, text: str, with_offsets: bool = False):
+        if not with_offsets:
+            folded = _NEEDS_TABLE_RE.sub(self._fold_run, text)
+            if self.casefold:
+                folded = folded.casefold()
+            if "\n" in folded and "-" in folded:
+                folded = _HYPHENATION_RE.sub("", folded)
+            # Пробелы схлопываем, только если есть двойные или не-ASCII пробельные
+            # символы (isprintable() ложно для любых пробельных, кроме " ")
+            if "  " in folded or not folded.isprintable():
+                return " ".join(folded.split()), None
+            return folded.strip(), None
+
+        pieces = []
+        offsets: List[int] = []
+        for index, char in enumerate(text):
+            piece = self._table[ord(char)]
+            pieces.append(piece)
+            offsets.extend([index] * len(piece))
+        folded = "".join(pieces)
+        folded, offsets = _sub_with_offsets(_HYPHENATION_RE, "", folded, offsets)
+        folded, offsets = _sub_with_offsets(_SPACES_RE, " ", folded, offsets)
+        stripped = folded.lstrip()
+        offsets = offsets[len(folded) - len(stripped):]
+        folded = stripped.rstrip()
+        return folded, offsets[:len(folded)]
+
+    def fold(self, text: str) -> str:
+        """Нормализованная строка (без карты позиций)"""
+        if not text:
+            return ""
+        return self._apply(self._source(text))[0]
+
+    def normalize(self, text: str) -> NormalizedText:
+        """Нормализованный текст с картой позиций в исходный"""
+        text = text or ""
+        return NormalizedText(text, self.fold(text), self)
+
+
+def _sub_with_offsets(pattern: re.Pattern, repl: str, text: str, offsets: List[int]):
+    """re.sub, который одновременно обновляет карту позиций"""
+    pieces = []
+    new_offsets: List[int] = []
+    last = 0
+    for match in pattern.finditer(text):
+        pieces.append(text[last:match.start()])
+        new_offsets.extend(offsets[last:match.start()])
+        if repl:
+            pieces.append(repl)
+            new_offsets.extend([offsets[match.start()]] * len(repl))
+        last = match.end()
+    pieces.append(text[last:])
+    new_offsets.extend(offsets[last:])
+    return "".join(pieces), new_offsets
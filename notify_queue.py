@@ -0,0 +1,163 @@
+"""
+Ограниченная очередь уведомлений между обработчиком сообщений и отправкой
+Поиск ключевых слов выполняется в обработчике событий, а отправка в Telegram -
+пулом воркеров, поэтому медленный send_message или FloodWait не задерживает
+обработку следующих сообщений
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, List, NamedTuple, Optional
+
+from log import get_logger
+
+log = get_logger("notify_queue")
+
+
+class Alert(NamedTuple):
+    """Найденное совпадение, ожидающее отправки уведомления"""
+    event: Any            # Событие Telethon с исходным сообщением
+    client: Any           # Клиент, получивший сообщение
+    channel_name: str
+    message_text: str
+    keywords: list
+    normalized: Any = None  # NormalizedText: нормализованный текст с картой позиций
+    edited: bool = False    # Совпадение в отредактированном сообщении
+    tracked_edit: bool = False  # Правка, предыдущая версия которой известна (EditTracker)
+    severity: Optional[str] = None  # Важность сработавших правил (config.RULES)
+    chat: Optional[str] = None      # Чат для уведомления из правила (None - NOTIFY_CHAT_ID)
+
+
+class AlertMessage(NamedTuple):
+    """
+    Данные уведомления без объектов Telethon
+    (можно передать между процессами через multiprocessing.Queue)
+    """
+    channel_name: str       # Название канала
+    message_id: int
+    message_text: str
+    keywords: list
+    channel_link: Optional[str] = None
+    fragments: list = []    # Совпавшие фрагменты исходного текста
+    edited: bool = False
+    fingerprints: list = []  # Отпечатки для отсева повторов (см. dedup.py)
+    severity: Optional[str] = None
+    chat: Optional[str] = None
+    destinations: tuple = ()  # Получатели (см. destinations.py); пусто - только chat
+    tracked_edit: bool = False  # Правка с известной предыдущей версией: повтором не считается
+
+
+class NotificationQueue:
+    """
+    Очередь с ограниченным размером и пулом воркеров-отправителей
+    Если очередь заполнена, put() ждет освобождения места (backpressure)
+    on_drain вызывается при остановке после отправки оставшихся уведомлений,
+    on_idle - каждый раз, когда очередь опустела и все воркеры свободны
+    """
+
+    def __init__(self, deliver: Callable[[Any], Awaitable[None]], maxsize: int = 1000,
+                 workers: int = 4, report_interval: float = 60.0,
+                 on_drain: Callable[[], Awaitable[None]] = None,
+                 on_idle: Callable[[], Awaitable[None]] = None):
+        self.deliver = deliver
+        self.on_drain = on_drain
+        self.on_idle = on_idle
+        self._busy = 0         # Воркеров, отправляющих уведомление
+        self.workers = max(1, workers)
+        self.report_interval = report_interval
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._tasks: List[asyncio.Task] = []
+
+        # Метрики очереди
+        self.enqueued = 0
+        self.delivered = 0
+        self.failed = 0
+        self.blocked = 0       # Сколько раз put() ждал свободного места
+        self.max_depth = 0
+
+    @property
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+    def stats(self) -> dict:
+        """Текущие метрики очереди"""
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "maxsize": self.queue.maxsize,
+            "workers": self.workers,
+            "enqueued": self.enqueued,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "blocked": self.blocked,
+        }
+
+    def start(self):
+        """Запускает воркеры (вызывать внутри работающего event loop)"""
+        if self._tasks:
+            return
+        for index in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(), name=f"notify-worker-{index}"))
+        if self.report_interval:
+            self._tasks.append(asyncio.create_task(self._reporter(), name="notify-reporter"))
+
+    async def put(self, item):
+        """Ставит уведомление в очередь, ожидая места, если она заполнена"""
+        if self.queue.full():
+            self.blocked += 1
+        await self.queue.put(item)
+        self.enqueued += 1
+        if self.depth > self.max_depth:
+            self.max_depth = self.depth
+
+    async def _worker(self):
+        while True:
+            item = await self.queue.get()
+            self._busy += 1
+            try:
+                await self.deliver(item)
+                self.delivered += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                log.warning("Ошибка при отправке уведомления из очереди", extra={"error": str(e)})
+            finally:
+                self._busy -= 1
+                self.queue.task_done()
+            if self.on_idle is not None and self.queue.empty() and not self._busy:
+                # Например, отправка дайджеста, как только всплеск совпадений закончился
+                try:
+                    await self.on_idle()
+                except Exception as e:
+                    log.warning("Ошибка при обработке пустой очереди", extra={"error": str(e)})
+
+    async def _reporter(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            if self.depth or self.blocked:
+                log.info("Очередь уведомлений", extra=self.stats())
+
+    async def stop(self, timeout: float = 30.0):
+        """
+        Дожидается отправки оставшихся уведомлений (не дольше timeout секунд)
+        и останавливает воркеры, затем вызывает on_drain
+        """
+        if not self._tasks:
+            return
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=timeout)
+            log.info("Очередь уведомлений отправлена", extra={"seconds": round(time.monotonic() - started, 1)})
+        except asyncio.TimeoutError:
+            log.warning("Не удалось отправить все уведомления", extra={"left": self.depth, "timeout": timeout})
+        if self.on_drain is not None:
+            # Например, отправка накопленного дайджеста
+            try:
+                await self.on_drain()
+            except Exception as e:
+                log.warning("Ошибка при завершении очереди уведомлений", extra={"error": str(e)})
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
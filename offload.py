@@ -0,0 +1,123 @@
+"""
+Поиск ключевых слов в пуле процессов для длинных сообщений
+Поиск по длинному посту с большим набором ключевых слов - синхронная работа
+на event loop: пока она идет, клиент не отвечает на ping и может потерять
+соединение. Сообщения длиннее порога отправляются в ProcessPoolExecutor,
+в процессы которого заранее передаются скомпилированные наборы ключевых слов
+"""
+
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from normalize import NormalizedText
+
+# Наборы ключевых слов в процессе пула (индекс -> matcher)
+_worker_matchers: list = []
+
+
+def _init_worker(matchers: list):
+    # Matcher передается целиком (pickle), поэтому в процессе пула он такой же,
+    # как в основном процессе: с теми же настройками и правилами
+    global _worker_matchers
+    _worker_matchers = matchers
+
+
+def _ping() -> bool:
+    return True
+
+
+def _match_in_worker(index: int, text: str) -> Tuple[str, List[str], Optional[List[int]]]:
+    """
+    Нормализованный текст, найденные ключевые слова и (если они есть)
+    карта позиций для фрагментов в уведомлении - она тоже строится не в event loop
+    """
+    matcher = _worker_matchers[index]
+    normalized = matcher.normalize(text)
+    found = matcher.match(normalized)
+    return normalized.text, found, normalized.offsets if found else None
+
+
+class Turn:
+    """Место сообщения в очереди чата (см. ChatOrder)"""
+
+    __slots__ = ("order", "key", "previous", "finished")
+
+    def __init__(self, order: "ChatOrder", key, previous: Optional["Turn"]):
+        self.order = order
+        self.key = key
+        self.previous = previous
+        self.finished = asyncio.Event()
+
+    async def wait(self):
+        """Ждет, пока будут обработаны все предыдущие сообщения чата"""
+        if self.previous is not None:
+            await self.previous.finished.wait()
+            self.previous = None
+
+    def release(self):
+        self.previous = None
+        self.finished.set()
+        if self.order._tails.get(self.key) is self:
+            del self.order._tails[self.key]
+
+
+class ChatOrder:
+    """
+    Сохраняет порядок обработки сообщений внутри чата: короткое сообщение,
+    пришедшее после длинного, ждет, пока длинное проверит пул процессов
+    """
+
+    def __init__(self):
+        self._tails: Dict[int, Turn] = {}
+
+    def __len__(self) -> int:
+        return len(self._tails)
+
+    def reserve(self, key) -> Turn:
+        """Занимает место в очереди (вызывается до первого await обработчика)"""
+        turn = Turn(self, key, self._tails.get(key))
+        self._tails[key] = turn
+        return turn
+
+
+class MatchPool:
+    """
+    Пул процессов с заранее скомпилированными наборами ключевых слов
+    Набор выбирается по объекту matcher основного процесса
+    """
+
+    def __init__(self, matchers: Iterable, workers: int = 2, min_length: int = 2000):
+        self.min_length = min_length
+        self.order = ChatOrder()
+        # id(matcher) -> индекс набора в процессах пула (ссылки держим, чтобы id не переиспользовался)
+        self._matchers = list({id(matcher): matcher for matcher in matchers}.values())
+        self._indexes = {id(matcher): index for index, matcher in enumerate(self._matchers)}
+        self.workers = max(1, workers)
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self._matchers,)
+        )
+
+    def should_offload(self, text: str, matcher) -> bool:
+        return len(text) >= self.min_length and id(matcher) in self._indexes
+
+    async def warm_up(self):
+        """Запускает процессы пула заранее, чтобы первое длинное сообщение не ждало компиляции"""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.executor, _ping) for _ in range(self.workers)))
+
+    async def match(self, matcher, text: str) -> Tuple[NormalizedText, List[str]]:
+        """Нормализует текст и ищет ключевые слова в процессе пула"""
+        loop = asyncio.get_running_loop()
+        normalized_text, found, offsets = await loop.run_in_executor(
+            self.executor, _match_in_worker, self._indexes[id(matcher)], text
+        )
+        return NormalizedText(text, normalized_text, matcher.normalizer, offsets), found
+
+    def close(self, wait: bool = False):
+        """Останавливает пул; уже отправленные задачи завершаются"""
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,268 @@
+"""
+Очередь исходящих уведомлений на диске (outbox)
+Каждое уведомление записывается в журнал до отправки, а после успешной
+отправки в журнал добавляется отметка о доставке. При ошибке отправка
+повторяется с увеличивающейся паузой, при FloodWait - ровно через указанное
+Telegram время. После перезапуска неотправленные уведомления догружаются из журнала
+
+Журнал - JSON Lines, только дозапись:
+    {"op": "add", "id": 1, "chat": null, "text": "...", "random_id": 123, "created": 1700000000.0}
+    {"op": "sent", "id": 1}
+    {"op": "drop", "id": 1}
+random_id передается в Telegram вместе с сообщением: если процесс упал после
+отправки, но до отметки о доставке, повторная отправка с тем же random_id
+отклоняется сервером (RandomIdDuplicateError), и сообщение не дублируется
+"""
+
+import asyncio
+import json
+import os
+import pathlib
+import random
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Dict, Optional
+
+from telethon import errors
+from telethon.helpers import generate_random_long
+
+from log import get_logger
+
+log = get_logger("outbox")
+
+
+class UndeliverableError(Exception):
+    """Уведомление невозможно доставить (например, получатель удален из конфига) - повтор не поможет"""
+
+
+class OutboxEntry:
+    """Неотправленное уведомление"""
+
+    __slots__ = ("id", "chat", "text", "random_id", "created", "attempts", "next_attempt")
+
+    def __init__(self, id: int, chat: Optional[str], text: str, random_id: int, created: float):
+        self.id = id
+        self.chat = chat              # Чат из правила (None - NOTIFY_CHAT_ID)
+        self.text = text
+        self.random_id = random_id
+        self.created = created
+        self.attempts = 0
+        self.next_attempt = 0.0       # time.monotonic(), раньше которого не отправлять
+
+
+class Outbox:
+    """
+    Журнал уведомлений и планировщик их отправки
+    send(entry) - отправка одного уведомления; исключение означает, что его нужно повторить
+    (кроме UndeliverableError - такое уведомление удаляется из очереди)
+    Уведомления одного получателя (entry.chat) отправляются строго по порядку:
+    пока первое ждет повтора, следующие не отправляются. У каждого получателя
+    своя задача отправки, поэтому разные получатели друг друга не задерживают
+    """
+
+    def __init__(self, path, send: Callable[[OutboxEntry], Awaitable[None]],
+                 max_age: float = 24 * 3600, max_backoff: float = 300.0,
+                 compact_after: int = 1000):
+        self.path = pathlib.Path(path)
+        self.send = send
+        self.max_age = max_age
+        self.max_backoff = max_backoff
+        self.compact_after = compact_after
+        self._pending: "OrderedDict[int, OutboxEntry]" = OrderedDict()
+        self._next_id = 1
+        self._finished_records = 0    # Отметок о доставке в журнале (для сжатия)
+        self._file = None
+        # Очереди получателей и их задачи отправки
+        self._queues: Dict[Optional[str], Deque[OutboxEntry]] = {}
+        self._wakeups: Dict[Optional[str], asyncio.Event] = {}
+        self._tasks: Dict[Optional[str], asyncio.Task] = {}
+        self._started = False
+
+        self.sent = 0
+        self.retries = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    def load(self):
+        """Загружает неотправленные уведомления из журнала и сжимает его"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            lines = []
+        now = time.time()
+        for line in lines:
+            try:
+                record = json.loads(line)
+                op, entry_id = record["op"], int(record["id"])
+                if op == "add":
+                    entry = OutboxEntry(entry_id, record.get("chat"), record["text"],
+                                        int(record["random_id"]), float(record["created"]))
+            except (ValueError, KeyError, TypeError):
+                # Последняя строка могла быть записана не полностью
+                continue
+            self._next_id = max(self._next_id, entry_id + 1)
+            if op == "add":
+                self._pending[entry_id] = entry
+            else:
+                self._pending.pop(entry_id, None)
+        for entry in list(self._pending.values()):
+            if now - entry.created > self.max_age:
+                self._drop(entry, "устарело")
+        self._compact()
+        for entry in self._pending.values():
+            self._enqueue(entry)
+        if self._pending:
+            log.info("Неотправленные уведомления из прошлого запуска", extra={"pending": len(self._pending)})
+
+    def _compact(self):
+        """Переписывает журнал, оставляя только неотправленные уведомления"""
+        if self._file is not None:
+            self._file.close()
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in self._pending.values():
+                f.write(self._add_record(entry))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._finished_records = 0
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    @staticmethod
+    def _add_record(entry: OutboxEntry) -> str:
+        return json.dumps({
+            "op": "add", "id": entry.id, "chat": entry.chat, "text": entry.text,
+            "random_id": entry.random_id, "created": entry.created
+        }, ensure_ascii=False) + "\n"
+
+    def _append(self, line: str):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(line)
+        # Запись попадает в ОС сразу: она переживет падение или перезапуск процесса
+        self._file.flush()
+
+    def add(self, chat: Optional[str], text: str) -> OutboxEntry:
+        """Записывает уведомление в журнал и ставит его в очередь на отправку"""
+        entry = OutboxEntry(self._next_id, chat, text, generate_random_long(), time.time())
+        self._next_id += 1
+        self._append(self._add_record(entry))
+        self._pending[entry.id] = entry
+        self._enqueue(entry)
+        return entry
+
+    def _enqueue(self, entry: OutboxEntry):
+        queue = self._queues.get(entry.chat)
+        if queue is None:
+            queue = self._queues[entry.chat] = deque()
+            self._wakeups[entry.chat] = asyncio.Event()
+        queue.append(entry)
+        self._wakeups[entry.chat].set()
+        if self._started and entry.chat not in self._tasks:
+            self._start_worker(entry.chat)
+
+    def _finish(self, entry: OutboxEntry, op: str):
+        self._pending.pop(entry.id, None)
+        self._append(json.dumps({"op": op, "id": entry.id}) + "\n")
+        self._finished_records += 1
+        if self._finished_records >= self.compact_after:
+            self._compact()
+
+    def _drop(self, entry: OutboxEntry, reason: str):
+        self.dropped += 1
+        log.error("Уведомление не отправлено и удалено из очереди",
+                  extra={"id": entry.id, "chat": entry.chat, "attempts": entry.attempts, "reason": reason})
+        self._finish(entry, "drop")
+
+    def _backoff(self, attempts: int) -> float:
+        # Экспоненциальная пауза со случайным разбросом, чтобы повторы не шли пачкой
+        delay = min(self.max_backoff, 2.0 ** min(attempts, 30))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _attempt(self, entry: OutboxEntry):
+        entry.attempts += 1
+        try:
+            await self.send(entry)
+        except errors.RandomIdDuplicateError:
+            # Уже было отправлено до перезапуска, но отметка не успела записаться
+            log.info("Уведомление уже было отправлено", extra={"id": entry.id})
+        except UndeliverableError as e:
+            self._drop(entry, str(e))
+            return
+        except errors.FloodWaitError as e:
+            self.retries += 1
+            entry.next_attempt = time.monotonic() + e.seconds
+            log.warning("FloodWait при отправке уведомления, повтор по расписанию",
+                        extra={"id": entry.id, "chat": entry.chat, "seconds": e.seconds})
+            return
+        except Exception as e:
+            if time.time() - entry.created > self.max_age:
+                self._drop(entry, str(e))
+                return
+            self.retries += 1
+            entry.next_attempt = time.monotonic() + self._backoff(entry.attempts)
+            log.warning("Ошибка при отправке уведомления, повтор позже",
+                        extra={"id": entry.id, "chat": entry.chat, "attempts": entry.attempts,
+                               "retry_in": round(entry.next_attempt - time.monotonic(), 1), "error": str(e)})
+            return
+        self.sent += 1
+        self._finish(entry, "sent")
+
+    async def _chat_worker(self, chat: Optional[str]):
+        """Отправка уведомлений одного получателя по порядку"""
+        queue = self._queues[chat]
+        wakeup = self._wakeups[chat]
+        while True:
+            if not queue:
+                wakeup.clear()
+                await wakeup.wait()
+                continue
+            entry = queue[0]
+            # Первое уведомление ждет повтора (или конца FloodWait) - следующие ждут вместе с ним
+            delay = entry.next_attempt - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            await self._attempt(entry)
+            if entry.id not in self._pending:
+                queue.popleft()
+
+    def _start_worker(self, chat: Optional[str]):
+        self._tasks[chat] = asyncio.create_task(self._chat_worker(chat), name=f"outbox-{chat or 'default'}")
+
+    def start(self):
+        """Запускает отправку (вызывать внутри работающего event loop)"""
+        if self._started:
+            return
+        self._started = True
+        for chat in self._queues:
+            self._start_worker(chat)
+
+    async def stop(self, timeout: float = 10.0):
+        """
+        Дает отправить оставшиеся уведомления (не дольше timeout секунд) и останавливает
+        отправку. Неотправленные остаются в журнале до следующего запуска
+        """
+        if self._started:
+            deadline = time.monotonic() + timeout
+            # Ждем, только пока есть уведомления, которые можно отправить до deadline
+            while (time.monotonic() < deadline
+                   and any(entry.next_attempt < deadline for entry in self._pending.values())):
+                await asyncio.sleep(0.1)
+            for task in self._tasks.values():
+                task.cancel()
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+            self._tasks = {}
+            self._started = False
+        if self._pending:
+            log.warning("Уведомления будут отправлены после перезапуска", extra={"pending": len(self._pending)})
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,101 @@
+"""
+Переподключение к Telegram без перезапуска процесса
+Telethon сам восстанавливает соединение несколько раз подряд, но если это
+не удалось, run_until_disconnected() завершается ошибкой. Раньше после этого
+процесс падал и перезапускался systemd (RestartSec=10): заново загружались
+сессия, entity и ключевые слова. Здесь клиент переподключается в том же
+процессе с растущей паузой со случайным разбросом, а скомпилированные
+ключевые слова, кэши и очереди остаются в памяти
+"""
+
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Optional
+
+import metrics
+from log import get_logger
+
+log = get_logger("reconnect")
+
+
+class SessionUnauthorizedError(RuntimeError):
+    """Сессия больше не авторизована - переподключение не поможет"""
+
+
+def is_connection_error(error: BaseException) -> bool:
+    """Ошибка сети (а не ошибка в коде бота)"""
+    if isinstance(error, (ConnectionError, OSError, asyncio.TimeoutError)):
+        return True
+    message = str(error).lower()
+    return "connection" in message or "reset" in message or "peer" in message
+
+
+def backoff_delay(attempt: int, initial: float, maximum: float) -> float:
+    """Пауза перед попыткой attempt: растет экспоненциально, со случайным разбросом"""
+    # Степень ограничена: при долгом обрыве 2.0 ** attempt переполнился бы (OverflowError)
+    return random.uniform(initial / 2, min(maximum, initial * 2.0 ** min(attempt - 1, 30)))
+
+
+async def reconnect(client, name: str = "user", initial_delay: float = 1.0, max_delay: float = 60.0) -> float:
+    """Подключается заново, пока не получится; возвращает время без соединения (секунды)"""
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            await client.connect()
+            authorized = await client.is_user_authorized()
+        except Exception as e:
+            if not is_connection_error(e):
+                raise
+            delay = backoff_delay(attempt, initial_delay, max_delay)
+            metrics.RECONNECT_ATTEMPTS.inc(name)
+            log.warning("Не удалось переподключиться к Telegram",
+                        extra={"client": name, "attempt": attempt, "retry_in": round(delay, 1), "error": str(e)})
+            await asyncio.sleep(delay)
+            continue
+        if not authorized:
+            raise SessionUnauthorizedError("сессия не авторизована")
+        break
+    try:
+        # Обновления, пришедшие за время обрыва (Telethon запрашивает разницу с сервера)
+        await client.catch_up()
+    except Exception as e:
+        log.warning("Не удалось получить пропущенные обновления", extra={"client": name, "error": str(e)})
+    return time.monotonic() - started
+
+
+async def run_until_stopped(client, name: str = "user",
+                            on_disconnect: Optional[Callable[[], None]] = None,
+                            on_reconnect: Optional[Callable[[], Awaitable[None]]] = None,
+                            initial_delay: float = 1.0, max_delay: float = 60.0):
+    """
+    Как client.run_until_disconnected(), но после потери соединения переподключается
+    Завершается, только когда клиент отключен намеренно (client.disconnect())
+    on_disconnect - вызывается при потере соединения,
+    on_reconnect - после переподключения (например, догрузка пропущенных сообщений)
+    """
+    while True:
+        try:
+            await client.run_until_disconnected()
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if not is_connection_error(e):
+                raise
+            error = e
+        metrics.DISCONNECTED.set(1, name)
+        log.warning("Соединение с Telegram потеряно, переподключаемся", extra={"client": name, "error": str(error)})
+        if on_disconnect is not None:
+            on_disconnect()
+        seconds = await reconnect(client, name, initial_delay, max_delay)
+        metrics.DISCONNECTED.set(0, name)
+        metrics.RECONNECT_SECONDS.observe(seconds, name)
+        log.info("Соединение с Telegram восстановлено", extra={"client": name, "seconds": round(seconds, 1)})
+        if on_reconnect is not None:
+            try:
+                await on_reconnect()
+            except Exception as e:
+                log.warning("Ошибка после переподключения", extra={"client": name, "error": str(e)})
@@ -0,0 +1,83 @@
+"""
+Перезагрузка ключевых слов и списка каналов без перезапуска клиента
+Перезагрузка запускается сигналом SIGHUP или при изменении файлов конфигурации
+(config.py, .env), которые проверяются раз в interval секунд
+"""
+
+import asyncio
+import os
+import pathlib
+import signal
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+from log import get_logger
+
+log = get_logger("reload")
+
+
+class ConfigWatcher:
+    """
+    Следит за файлами конфигурации и вызывает callback при их изменении
+    или по сигналу SIGHUP. Перезагрузки выполняются по одной
+    """
+
+    def __init__(self, paths: Iterable, callback: Callable[[], Awaitable[None]], interval: float = 5.0):
+        self.paths = [pathlib.Path(path) for path in paths]
+        self.callback = callback
+        self.interval = interval
+        self._mtimes: Dict[pathlib.Path, Optional[float]] = {path: self._mtime(path) for path in self.paths}
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._signal_installed = False
+
+    @staticmethod
+    def _mtime(path: pathlib.Path) -> Optional[float]:
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return None
+
+    def start(self):
+        """Устанавливает обработчик SIGHUP и запускает проверку файлов"""
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGHUP, self.trigger, "SIGHUP")
+            self._signal_installed = True
+        except (NotImplementedError, AttributeError, RuntimeError):
+            # SIGHUP недоступен (например, в Windows) - остается проверка файлов
+            pass
+        if self.interval:
+            self._task = asyncio.create_task(self._poll())
+
+    def stop(self):
+        if self._signal_installed:
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
+            self._signal_installed = False
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def trigger(self, reason: str = "manual"):
+        """Запускает перезагрузку в фоне"""
+        asyncio.create_task(self.reload(reason))
+
+    async def reload(self, reason: str):
+        async with self._lock:
+            log.info("Перезагрузка конфигурации", extra={"reason": reason})
+            try:
+                await self.callback()
+            except Exception as e:
+                # Ошибка в новой конфигурации - продолжаем работать со старой
+                log.error("Не удалось перезагрузить конфигурацию, оставлена прежняя", extra={"error": str(e)})
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            changed = []
+            for path in self.paths:
+                mtime = self._mtime(path)
+                if mtime != self._mtimes.get(path):
+                    self._mtimes[path] = mtime
+                    changed.append(path.name)
+            if changed:
+                await self.reload("изменены " + ", ".join(changed))
@@ -0,0 +1,332 @@
+"""
+Правила поиска: булевы выражения над ключевыми фразами и регулярными выражениями
+    шлях AND (закрыт OR ремонт) NOT реклама
+    "трасса м-05" OR /траса\\s+м-?0?5/i
+
+Все фразы всех правил компилируются в один общий matcher (см. matcher.py),
+поэтому текст просматривается один раз при любом числе правил. Результат
+прохода - битовая маска найденных фраз, по которой вычисляются выражения правил.
+Регулярные выражения проверяются лениво - только если от них зависит результат.
+Они применяются к исходному тексту (в форме NFC), а регистр учитывают, если нет флага i
+"""
+
+import re
+import unicodedata
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from normalize import NormalizedText
+
+# Порядок важности: уведомление получает наибольшую из важностей сработавших правил
+SEVERITIES = ("low", "normal", "high", "critical")
+
+_TOKEN_RE = re.compile(r'\s*(?:(\()|(\))|"([^"]*)"|/((?:\\.|[^/\\])+)/([a-z]*)|([^\s()"]+))')
+_OPERATORS = {"AND", "OR", "NOT"}
+
+
+class RuleError(ValueError):
+    """Ошибка в тексте правила"""
+
+
+class Rule(NamedTuple):
+    """Правило из config.RULES"""
+    name: str
+    expression: str
+    severity: str = "normal"
+    chat: Optional[str] = None   # Чат для уведомлений (None - NOTIFY_CHAT_ID)
+
+
+def _tokenize(expression: str) -> List[Tuple[str, object]]:
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = _TOKEN_RE.match(expression, position)
+        if match is None or match.end() == position:
+            raise RuleError(f"не удалось разобрать: {expression[position:]!r}")
+        position = match.end()
+        open_paren, close_paren, phrase, regex, flags, word = match.groups()
+        if open_paren:
+            tokens.append(("(", None))
+        elif close_paren:
+            tokens.append((")", None))
+        elif phrase is not None:
+            tokens.append(("phrase", phrase))
+        elif regex is not None:
+            tokens.append(("regex", (regex, flags)))
+        elif word in _OPERATORS:
+            tokens.append((word, None))
+        else:
+            tokens.append(("phrase", word))
+    return tokens
+
+
+class _Parser:
+    """
+    Разбор выражения (по убыванию приоритета: NOT, AND, OR)
+    Соседние условия без оператора объединяются через AND: "a NOT b" = "a AND NOT b"
+    Узлы: ("phrase", текст), ("regex", (шаблон, флаги)), ("not", узел),
+    ("and", [узлы]), ("or", [узлы])
+    """
+
+    def __init__(self, expression: str):
+        self.tokens = _tokenize(expression)
+        self.position = 0
+
+    def parse(self):
+        if not self.tokens:
+            raise RuleError("пустое правило")
+        node = self._or()
+        if self.position != len(self.tokens):
+            raise RuleError(f"лишний элемент: {self.tokens[self.position][0]}")
+        return node
+
+    def _peek(self) -> Optional[str]:
+        return self.tokens[self.position][0] if self.position < len(self.tokens) else None
+
+    def _or(self):
+        nodes = [self._and()]
+        while self._peek() == "OR":
+            self.position += 1
+            nodes.append(self._and())
+        return nodes[0] if len(nodes) == 1 else ("or", nodes)
+
+    def _and(self):
+        nodes = [self._not()]
+        while self._peek() not in (None, "OR", ")"):
+            if self._peek() == "AND":
+                self.position += 1
+            nodes.append(self._not())
+        return nodes[0] if len(nodes) == 1 else ("and", nodes)
+
+    def _not(self):
+        if self._peek() == "NOT":
+            self.position += 1
+            return ("not", self._not())
+        return self._atom()
+
+    def _atom(self):
+        kind = self._peek()
+        if kind is None:
+            raise RuleError("неожиданный конец правила")
+        kind, value = self.tokens[self.position]
+        self.position += 1
+        if kind == "(":
+            node = self._or()
+            if self._peek() != ")":
+                raise RuleError("нет закрывающей скобки")
+            self.position += 1
+            return node
+        if kind in ("phrase", "regex"):
+            return (kind, value)
+        raise RuleError(f"ожидалось условие, а не {kind}")
+
+
+def parse_rule(expression: str):
+    """Разбирает выражение правила в дерево (см. _Parser)"""
+    return _Parser(expression).parse()
+
+
+class _CompiledRule(NamedTuple):
+    rule: Rule
+    evaluate: Callable      # evaluate(bits, regex) -> bool
+    trigger: int            # Маска фраз, без одной из которых правило не сработает (0 - нет)
+
+
+class RuleSet:
+    """
+    Скомпилированный набор правил с тем же интерфейсом, что и у KeywordMatcher:
+    match() возвращает имена сработавших правил
+    Простые ключевые слова (keywords) становятся правилами из одной фразы
+    """
+
+    def __init__(self, keywords: Iterable[str], rules: Iterable[Union[dict, Rule]],
+                 compile_phrases: Callable[[List[str]], object]):
+        self.rules: List[Rule] = []
+        trees = []
+        for keyword in keywords:
+            if keyword.strip():
+                self.rules.append(Rule(keyword, keyword))
+                trees.append(("phrase", keyword))
+        for rule in rules:
+            if isinstance(rule, dict):
+                rule = Rule(
+                    name=str(rule.get("name") or rule["rule"]),
+                    expression=rule["rule"],
+                    severity=rule.get("severity", "normal"),
+                    chat=str(rule["chat"]) if rule.get("chat") is not None else None
+                )
+            if rule.severity not in SEVERITIES:
+                raise RuleError(f"неизвестная важность {rule.severity!r} в правиле {rule.name!r}")
+            try:
+                trees.append(parse_rule(rule.expression))
+            except RuleError as e:
+                raise RuleError(f"правило {rule.name!r}: {e}") from None
+            self.rules.append(rule)
+        self.keywords: List[str] = [rule.name for rule in self.rules]
+        self._trees = trees
+
+        # Общие для всех правил фразы и регулярные выражения
+        self._phrases: List[str] = []
+        self._phrase_bits: Dict[str, int] = {}
+        self._regexes: List[re.Pattern] = []
+        for tree in trees:
+            self._collect(tree)
+        self._matcher = compile_phrases(self._phrases)
+        self.normalizer = self._matcher.normalizer
+        self.case_insensitive = self._matcher.case_insensitive
+
+        self._compiled = [self._compile(rule, tree) for rule, tree in zip(self.rules, trees)]
+        # Фраза -> правила, которые могут сработать при ее наличии; правила без
+        # обязательных фраз (например, только регулярное выражение) проверяются всегда
+        self._by_phrase: Dict[int, List[int]] = {}
+        self._always: List[int] = []
+        for index, compiled in enumerate(self._compiled):
+            if not compiled.trigger:
+                self._always.append(index)
+                continue
+            bits = compiled.trigger
+            while bits:
+                bit = bits & -bits
+                self._by_phrase.setdefault(bit, []).append(index)
+                bits ^= bit
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def _collect(self, node):
+        kind, value = node
+        if kind == "phrase":
+            if value.strip() and value not in self._phrase_bits:
+                self._phrase_bits[value] = 1 << len(self._phrases)
+                self._phrases.append(value)
+        elif kind == "regex":
+            pattern, flags = value
+            try:
+                compiled = re.compile(pattern, re.IGNORECASE if "i" in flags else 0)
+            except re.error as e:
+                raise RuleError(f"ошибка в регулярном выражении /{pattern}/: {e}") from None
+            # Одинаковые регулярные выражения проверяются один раз
+            node_key = (compiled.pattern, compiled.flags)
+            if all((r.pattern, r.flags) != node_key for r in self._regexes):
+                self._regexes.append(compiled)
+        else:
+            for child in (value if kind in ("and", "or") else [value]):
+                self._collect(child)
+
+    def _regex_index(self, pattern: str, flags: str) -> int:
+        flag_value = re.IGNORECASE if "i" in flags else 0
+        for index, compiled in enumerate(self._regexes):
+            if compiled.pattern == pattern and compiled.flags & re.IGNORECASE == flag_value:
+                return index
+        raise RuleError(f"регулярное выражение не найдено: /{pattern}/")
+
+    def _source(self, node) -> str:
+        """Выражение Python над маской фраз bits и функцией regex(i)"""
+        kind, value = node
+        if kind == "phrase":
+            bit = self._phrase_bits.get(value)
+            return f"(bits & {bit})" if bit else "False"
+        if kind == "regex":
+            return f"regex({self._regex_index(*value)})"
+        if kind == "not":
+            return f"(not {self._source(value)})"
+        operator = " and " if kind == "and" else " or "
+        return "(" + operator.join(self._source(child) for child in value) + ")"
+
+    def _trigger(self, node) -> int:
+        """Маска фраз, хотя бы одна из которых обязательна для срабатывания (0 - нет такой)"""
+        kind, value = node
+        if kind == "phrase":
+            return self._phrase_bits.get(value, 0)
+        if kind == "and":
+            triggers = [trigger for trigger in map(self._trigger, value) if trigger]
+            # Достаточно одного условия AND - берем то, где меньше фраз
+            return min(triggers, key=lambda bits: bin(bits).count("1")) if triggers else 0
+        if kind == "or":
+            triggers = [self._trigger(child) for child in value]
+            return 0 if not all(triggers) else _union(triggers)
+        return 0
+
+    def _compile(self, rule: Rule, tree) -> _CompiledRule:
+        # Выражение компилируется в функцию Python один раз
+        evaluate = eval(f"lambda bits, regex: bool({self._source(tree)})", {"__builtins__": {"bool": bool}})
+        return _CompiledRule(rule, evaluate, self._trigger(tree))
+
+    def __getstate__(self):
+        # Скомпилированные функции не сериализуются (нужно для пула процессов, см. offload.py)
+        state = self.__dict__.copy()
+        del state["_compiled"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._compiled = [self._compile(rule, tree) for rule, tree in zip(self.rules, self._trees)]
+
+    def normalize(self, text: str) -> NormalizedText:
+        return self._matcher.normalize(text)
+
+    def match(self, text: Union[str, NormalizedText]) -> List[str]:
+        """Имена сработавших правил в порядке, в котором они заданы в конфиге"""
+        if not text:
+            return []
+        if not isinstance(text, NormalizedText):
+            text = self._matcher.normalize(text)
+        bits = 0
+        phrase_bits = self._phrase_bits
+        for phrase in self._matcher.match(text):
+            bits |= phrase_bits[phrase]
+
+        candidates = set(self._always)
+        remaining = bits
+        while remaining:
+            bit = remaining & -remaining
+            candidates.update(self._by_phrase.get(bit, ()))
+            remaining ^= bit
+        if not candidates:
+            return []
+
+        # Нормализованный текст для регулярных выражений не подходит: латиница
+        # в нем заменена похожими кириллическими буквами
+        original = text.original
+        source = None
+        regexes = self._regexes
+        results: Dict[int, bool] = {}
+
+        def regex(index: int) -> bool:
+            nonlocal source
+            result = results.get(index)
+            if result is None:
+                if source is None:
+                    source = _nfc(original)
+                result = results[index] = regexes[index].search(source) is not None
+            return result
+
+        compiled = self._compiled
+        return [compiled[index].rule.name for index in sorted(candidates)
+                if compiled[index].evaluate(bits, regex)]
+
+    def group(self, names: List[str]) -> List[Tuple[Optional[str], str, List[str]]]:
+        """
+        Разбивает сработавшие правила по чатам уведомлений
+        Возвращает (чат или None, наибольшая важность, имена правил)
+        """
+        by_name = {rule.name: rule for rule in self.rules}
+        groups: Dict[Optional[str], List[Rule]] = {}
+        for name in names:
+            rule = by_name[name]
+            groups.setdefault(rule.chat, []).append(rule)
+        return [
+            (chat, max((rule.severity for rule in rules), key=SEVERITIES.index), [rule.name for rule in rules])
+            for chat, rules in groups.items()
+        ]
+
+
+def _nfc(text: str) -> str:
+    return text if unicodedata.is_normalized("NFC", text) else unicodedata.normalize("NFC", text)
+
+
+def _union(masks: List[int]) -> int:
+    result = 0
+    for mask in masks:
+        result |= mask
+    return result
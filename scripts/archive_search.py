@@ -0,0 +1,114 @@
+"""
+Поиск по локальному архиву сообщений (см. archive.py, ARCHIVE_ENABLED в config.py)
+Работает без подключения к Telegram
+
+Запуск:
+    python scripts/archive_search.py search "шлях" --since 7d
+    python scripts/archive_search.py search '"трасса м-05" OR ремонт*' --channel @channel_one
+    python scripts/archive_search.py replay --since 30d                    # KEYWORDS и RULES из config.py
+    python scripts/archive_search.py replay --keywords перекрытие объезд   # новый набор ключевых слов
+    python scripts/archive_search.py stats
+"""
+
+import argparse
+import pathlib
+import re
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+import config  # noqa: E402
+from archive import connect, iter_messages, search  # noqa: E402
+from channels import compile_keywords  # noqa: E402
+
+_PERIOD_RE = re.compile(r"^(\d+)([mhdw])$")
+_PERIOD_SECONDS = {"m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+def parse_since(value: str) -> float:
+    """'7d', '12h', '30m', '2w' - период до текущего момента, иначе дата ГГГГ-ММ-ДД"""
+    match = _PERIOD_RE.match(value)
+    if match:
+        return time.time() - int(match.group(1)) * _PERIOD_SECONDS[match.group(2)]
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"ожидается период (7d, 12h) или дата ГГГГ-ММ-ДД: {value}") from None
+
+
+def format_date(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M")
+
+
+def run_search(conn, args):
+    started = time.perf_counter()
+    results = search(conn, args.query, since=args.since, channel=args.channel, limit=args.limit)
+    elapsed = time.perf_counter() - started
+    for message, snippet in results:
+        print(f"{format_date(message.date)}  {message.channel}  #{message.message_id}")
+        print(f"    {' '.join(snippet.split())}")
+    print(f"Найдено: {len(results)} (показано не больше {args.limit}) за {elapsed * 1000:.1f} мс")
+
+
+def run_replay(conn, args):
+    matcher = compile_keywords(args.keywords or config.KEYWORDS)
+    started = time.perf_counter()
+    checked = 0
+    found = 0
+    for message in iter_messages(conn, since=args.since, channel=args.channel):
+        checked += 1
+        keywords = matcher.match(message.text)
+        if keywords:
+            found += 1
+            if found <= args.limit:
+                preview = " ".join(message.text.split())[:120]
+                print(f"{format_date(message.date)}  {message.channel}  #{message.message_id}  "
+                      f"[{', '.join(keywords)}]  {preview}")
+    elapsed = time.perf_counter() - started
+    rate = checked / elapsed if elapsed else 0.0
+    print(f"Проверено: {checked} сообщений, совпадений: {found} за {elapsed:.2f} с ({rate:.0f} сообщ./с)")
+
+
+def run_stats(conn, args):
+    total, first, last = conn.execute("SELECT count(*), min(date), max(date) FROM messages").fetchone()
+    print(f"Сообщений: {total}")
+    if total:
+        print(f"Период:    {format_date(first)} - {format_date(last)}")
+        for channel, count in conn.execute(
+                "SELECT channel, count(*) FROM messages GROUP BY channel ORDER BY count(*) DESC"):
+            print(f"    {channel}: {count}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Поиск по локальному архиву сообщений")
+    parser.add_argument("--db", default=str(pathlib.Path(config.ARCHIVE_PATH).absolute()),
+                        help="файл архива (по умолчанию ARCHIVE_PATH из config.py)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    search_parser = commands.add_parser("search", help="полнотекстовый поиск (синтаксис SQLite FTS5)")
+    search_parser.add_argument("query")
+
+    replay_parser = commands.add_parser("replay", help="проверить архив набором ключевых слов")
+    replay_parser.add_argument("--keywords", nargs="+", help="ключевые слова (по умолчанию KEYWORDS и RULES)")
+
+    for command in (search_parser, replay_parser):
+        command.add_argument("--since", type=parse_since, help="период (7d, 12h, 30m) или дата ГГГГ-ММ-ДД")
+        command.add_argument("--channel", help="только этот канал (как в CHANNEL_NAME/CHANNELS)")
+        command.add_argument("--limit", type=int, default=20, help="сколько результатов вывести")
+
+    commands.add_parser("stats", help="число сообщений по каналам")
+    args = parser.parse_args()
+
+    if not pathlib.Path(args.db).exists():
+        sys.exit(f"Архив не найден: {args.db} (включите ARCHIVE_ENABLED в config.py)")
+    conn = connect(args.db, readonly=True)
+    try:
+        {"search": run_search, "replay": run_replay, "stats": run_stats}[args.command](conn, args)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main_cli()
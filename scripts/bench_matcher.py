@@ -0,0 +1,93 @@
+"""
+Бенчмарк поиска ключевых слов
+Сравнивает прежний линейный перебор config.KEYWORDS с автоматом KeywordMatcher
+
+Запуск:
+    python scripts/bench_matcher.py
+    python scripts/bench_matcher.py --keywords 100 1000 20000 --text-length 4096
+"""
+
+import argparse
+import pathlib
+import random
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from matcher import KeywordMatcher  # noqa: E402
+
+ALPHABET = "абвгдеёжзийклмнопрстуфхцчшщъыьэюяієїґ"
+
+
+def legacy_check_keywords(text: str, keywords: list) -> list:
+    """Прежняя реализация main.check_keywords (поиск подстроки для каждого слова)"""
+    if not text:
+        return []
+    found_keywords = []
+    text_to_check = text.lower().strip()
+    for keyword in keywords:
+        keyword_to_check = keyword.lower().strip()
+        if keyword_to_check and keyword_to_check in text_to_check:
+            found_keywords.append(keyword)
+    return found_keywords
+
+
+def random_word(rng: random.Random, min_len: int = 4, max_len: int = 12) -> str:
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(min_len, max_len)))
+
+
+def random_text(rng: random.Random, length: int, keywords: list, hits: int) -> str:
+    words = []
+    size = 0
+    while size < length:
+        word = random_word(rng, 2, 10)
+        words.append(word)
+        size += len(word) + 1
+    for _ in range(hits):
+        words.insert(rng.randrange(len(words)), rng.choice(keywords).upper())
+    return " ".join(words)
+
+
+def measure(func, texts: list, repeat: int) -> float:
+    """Возвращает среднее время обработки одного текста в микросекундах"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for text in texts:
+            func(text)
+        best = min(best, time.perf_counter() - started)
+    return best / len(texts) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк поиска ключевых слов")
+    parser.add_argument("--keywords", type=int, nargs="+", default=[3, 100, 1000, 10000])
+    parser.add_argument("--text-length", type=int, default=2000)
+    parser.add_argument("--texts", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'слов':>8} {'компиляция, мс':>15} {'перебор, мкс':>14} {'автомат, мкс':>14} {'ускорение':>10}")
+    for count in args.keywords:
+        keywords = list({random_word(rng) for _ in range(count)})
+        texts = [random_text(rng, args.text_length, keywords, hits=3) for _ in range(args.texts)]
+
+        started = time.perf_counter()
+        matcher = KeywordMatcher(keywords)
+        compile_ms = (time.perf_counter() - started) * 1000
+
+        # Результаты обеих реализаций должны совпадать
+        for text in texts:
+            assert matcher.match(text) == legacy_check_keywords(text, keywords)
+
+        legacy_us = measure(lambda text: legacy_check_keywords(text, keywords), texts, args.repeat)
+        matcher_us = measure(matcher.match, texts, args.repeat)
+        print(f"{len(keywords):>8} {compile_ms:>15.1f} {legacy_us:>14.1f} {matcher_us:>14.1f} "
+              f"{legacy_us / matcher_us:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -46,7 +46,7 @@ echo "   python check_channel.py @test_sae"
 echo ""
 
 echo "💡 Рекомендации:"
-echo "   - Проверьте, что в логах есть: '✅ Подключение к Telegram установлено'"
+echo "   - Проверьте, что в логах есть: 'Подключение к Telegram установлено'"
 echo "   - Проверьте, что есть: '📡 Регистрирую обработчик для канала'"
 echo "   - Убедитесь, что аккаунт бота подписан на канал @test_sae"
 echo "   - Проверьте логи в реальном времени: sudo journalctl -u telegram-monitor.service -f"
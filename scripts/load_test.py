@@ -0,0 +1,344 @@
+"""
+Нагрузочный тест всего бота без сети
+Запускает main.main() с клиентом-заглушкой вместо TelegramClient: заглушка выдает
+события NewMessage с заданной частотой, как их выдавал бы Telegram, и записывает
+отправленные уведомления. Измеряются пропускная способность и задержка от появления
+сообщения в канале до отправки уведомления (очередь, outbox, ограничения скорости)
+
+Запуск:
+    python scripts/load_test.py --rate 1 10 100 1000 10000 --duration 10
+    python scripts/load_test.py --rate 1000 --match-rate 0.05 --send-delay 0.05
+    python scripts/load_test.py --rate 100 --telegram-limits --flood-rate 1   # лимиты Telegram и FloodWait
+"""
+
+import argparse
+import asyncio
+import contextlib
+import itertools
+import logging
+import math
+import os
+import pathlib
+import re
+import sys
+import tempfile
+import time
+from array import array
+from datetime import datetime, timezone
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from telethon import errors, events, types  # noqa: E402
+from telethon.utils import get_peer_id  # noqa: E402
+
+import config  # noqa: E402
+import main  # noqa: E402
+from destinations import Router  # noqa: E402
+from entity_cache import NotifyTarget  # noqa: E402
+from replay_bench import percentile, synthetic_corpus  # noqa: E402
+
+# Ссылка на сообщение в уведомлении: по ней находится время появления сообщения
+_LINK_RE = re.compile(r"t\.me/(\w+)/(\d+)")
+
+
+class FakeMessage:
+    def __init__(self, message_id: int, text: str):
+        self.id = message_id
+        self.message = text
+        self.date = datetime.now(timezone.utc)
+        self.grouped_id = None
+        self.fwd_from = None
+
+
+class FakeEvent:
+    """Событие с интерфейсом events.NewMessage.Event, используемым в main"""
+
+    def __init__(self, chat: types.Channel, message_id: int, text: str):
+        self.chat = chat
+        self.chat_id = get_peer_id(chat)
+        self.message = FakeMessage(message_id, text)
+
+    async def get_chat(self):
+        return self.chat
+
+
+class LoadStats:
+    """Результаты одного прогона"""
+
+    def __init__(self):
+        self.emitted = 0
+        self.handled = 0
+        self.sent = 0
+        self.duplicates = 0
+        self.flood_waits = 0
+        self.max_backlog = 0
+        self.started = 0.0
+        self.emit_finished = 0.0
+        self.handle_finished = 0.0
+        self.emit_lag = array("d")
+        self.latencies = array("d")
+        self.outbox = None
+
+
+class FakeClient:
+    """
+    Заглушка TelegramClient
+    Основной клиент после подключения выдает count сообщений с частотой rate
+    в каналы из channels и отключается. Каждое событие обрабатывается отдельной
+    задачей, как в Telethon. Отправленные сообщения записываются, а при превышении
+    flood_rate сообщений в секунду в один чат отправка завершается FloodWaitError
+    """
+
+    def __init__(self, stats: LoadStats, channels: list, texts, count: int, rate: float,
+                 send_delay: float = 0.0, flood_rate: float = 0.0, flood_burst: float = 3.0):
+        self.stats = stats
+        self.texts = texts
+        self.count = count
+        self.rate = rate
+        self.send_delay = send_delay
+        self.flood_rate = flood_rate
+        self.flood_burst = flood_burst
+        self.channels = {
+            name: types.Channel(id=1000000000 + index, title=f"Канал {index}", photo=types.ChatPhotoEmpty(),
+                                date=None, access_hash=index, username=f"load_channel_{index}")
+            for index, name in enumerate(channels, 1)
+        }
+        self.by_username = {channel.username: get_peer_id(channel) for channel in self.channels.values()}
+        self.handlers = []
+        self.connected = False
+        self.emitted_at = {}
+        self.seen_random_ids = set()
+        self.buckets = {}
+
+    # Подключение
+
+    async def start(self, *args, **kwargs):
+        self.connected = True
+        return self
+
+    async def connect(self):
+        self.connected = True
+
+    async def is_user_authorized(self):
+        return True
+
+    def is_connected(self):
+        return self.connected
+
+    async def disconnect(self):
+        self.connected = False
+
+    async def catch_up(self):
+        pass
+
+    # Каналы и чаты
+
+    async def get_input_entity(self, peer):
+        if isinstance(peer, str) and peer in self.channels:
+            channel = self.channels[peer]
+            return types.InputPeerChannel(channel.id, channel.access_hash)
+        if peer in ("me", "self"):
+            return types.InputPeerSelf()
+        raise ValueError(f"Cannot find any entity corresponding to {peer!r}")
+
+    async def get_entity(self, peer):
+        if isinstance(peer, list):
+            return [await self.get_entity(item) for item in peer]
+        if peer in self.channels:
+            return self.channels[peer]
+        for channel in self.channels.values():
+            if get_peer_id(channel) == peer:
+                return channel
+        raise ValueError(f"Cannot find any entity corresponding to {peer!r}")
+
+    async def iter_messages(self, *args, **kwargs):
+        # Пропущенных сообщений нет: история каналов пуста
+        return
+        yield
+
+    def add_event_handler(self, callback, event):
+        self.handlers.append((callback, event))
+
+    def remove_event_handler(self, callback, event=None):
+        self.handlers = [(c, e) for c, e in self.handlers if c is not callback]
+
+    # Поток обновлений
+
+    def _callbacks(self, chat_id: int) -> list:
+        # Альбомы и редактирования заглушка не выдает - только новые сообщения
+        return [callback for callback, event in self.handlers
+                if type(event) is events.NewMessage and (not event.chats or chat_id in event.chats)]
+
+    async def _dispatch(self, event: FakeEvent):
+        try:
+            for callback in self._callbacks(event.chat_id):
+                await callback(event)
+        except Exception as e:
+            logging.getLogger("load_test").error("Ошибка в обработчике: %s", e)
+        finally:
+            self.stats.handled += 1
+            self.stats.handle_finished = time.perf_counter()
+
+    async def run_until_disconnected(self):
+        stats = self.stats
+        channels = list(self.channels.values())
+        message_ids = dict.fromkeys(self.by_username.values(), 0)
+        pending = set()
+        stats.started = time.perf_counter()
+        for index, text in zip(range(self.count), self.texts):
+            due = stats.started + index / self.rate
+            now = time.perf_counter()
+            if due > now:
+                await asyncio.sleep(due - now)
+                now = time.perf_counter()
+            stats.emit_lag.append(max(0.0, now - due))
+            channel = channels[index % len(channels)]
+            event = FakeEvent(channel, message_ids[get_peer_id(channel)] + 1, text)
+            message_ids[event.chat_id] = event.message.id
+            self.emitted_at[(event.chat_id, event.message.id)] = now
+            task = asyncio.create_task(self._dispatch(event))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            stats.emitted += 1
+            stats.max_backlog = max(stats.max_backlog, len(pending))
+            if index % 64 == 63:
+                # Между пачками обновлений клиент читает сеть - event loop выполняет другие задачи
+                await asyncio.sleep(0)
+        stats.emit_finished = time.perf_counter()
+        if pending:
+            await asyncio.gather(*pending)
+        # Outbox остановится в main(); ссылка нужна, чтобы узнать, что осталось неотправленным
+        stats.outbox = getattr(main.handler, "outbox", None)
+        self.connected = False
+
+    # Отправка
+
+    def _check_flood(self, chat):
+        """Token bucket на чат, как у Telegram: при превышении - FloodWaitError"""
+        if not self.flood_rate:
+            return
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(chat, (self.flood_burst, now))
+        tokens = min(self.flood_burst, tokens + (now - updated) * self.flood_rate)
+        if tokens < 1.0:
+            self.buckets[chat] = (tokens, now)
+            self.stats.flood_waits += 1
+            raise errors.FloodWaitError(request=None, capture=math.ceil((1.0 - tokens) / self.flood_rate))
+        self.buckets[chat] = (tokens - 1.0, now)
+
+    def _record(self, text: str, entities=None):
+        self.stats.sent += 1
+        urls = [getattr(entity, "url", "") for entity in entities or ()]
+        for source in itertools.chain(urls, (text,)):
+            match = _LINK_RE.search(source)
+            if match is None:
+                continue
+            chat_id = self.by_username.get(match.group(1))
+            emitted = self.emitted_at.pop((chat_id, int(match.group(2))), None)
+            if emitted is not None:
+                # Задержка считается по первому уведомлению о сообщении
+                self.stats.latencies.append(time.perf_counter() - emitted)
+            break
+
+    async def send_message(self, entity, text, parse_mode=None):
+        if self.send_delay:
+            await asyncio.sleep(self.send_delay)
+        self._check_flood(str(entity))
+        self._record(text)
+
+    async def __call__(self, request):
+        if self.send_delay:
+            await asyncio.sleep(self.send_delay)
+        self._check_flood(str(request.peer))
+        if request.random_id in self.seen_random_ids:
+            self.stats.duplicates += 1
+            raise errors.RandomIdDuplicateError(request=request)
+        self.seen_random_ids.add(request.random_id)
+        self._record(request.message, request.entities)
+
+
+def run_load(rate: float, args) -> LoadStats:
+    """Один прогон main.main() с заглушкой клиента"""
+    stats = LoadStats()
+    count = max(1, int(rate * args.duration))
+    names = [f"@load_channel_{index}" for index in range(1, args.channels + 1)]
+    corpus = synthetic_corpus(count, args.match_rate, args.text_length, args.channels, args.seed)
+    texts = (event.message.message for event in corpus)
+
+    def client_factory(session, api_id, api_hash):
+        return FakeClient(stats, names, texts, count, rate, args.send_delay, args.flood_rate, args.flood_burst)
+
+    main.API_ID, main.API_HASH, main.BOT_TOKEN = 1, "load-test", None
+    main.CHANNEL_NAME = ",".join(names)
+    main.NOTIFY_CHAT_ID = "me"
+    main.notify_target = NotifyTarget("me")
+    if args.telegram_limits:
+        main.notify_router = main.build_router()
+    else:
+        # Без ограничений скорости измеряется сам бот, а не лимиты Telegram
+        main.notify_router = Router(main.notify_target, private_rate=1e9, group_rate=1e9, chats=main.rule_chats())
+    main.chat_cache.invalidate()
+
+    # Файлы состояния (сессия, outbox, кэши) - во временном каталоге, каждый прогон с чистого листа
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="load_test_") as workdir:
+        os.chdir(workdir)
+        try:
+            asyncio.run(main.main(client_factory))
+        finally:
+            os.chdir(cwd)
+    return stats
+
+
+def print_report(rate: float, stats: LoadStats):
+    emit_time = stats.emit_finished - stats.started
+    handle_time = stats.handle_finished - stats.started
+    print(f"Частота:             {rate:g} сообщ./с")
+    print(f"Сообщений:           {stats.emitted} (обработано {stats.handled})")
+    print(f"Выдача:              {stats.emitted / emit_time if emit_time else 0:.0f} сообщ./с, "
+          f"отставание p99 {percentile(stats.emit_lag, 0.99) * 1000:.1f} мс")
+    print(f"Обработка:           {stats.handled / handle_time if handle_time else 0:.0f} сообщ./с, "
+          f"задач в очереди макс. {stats.max_backlog}")
+    print(f"Уведомлений:         {stats.sent} (повторов отклонено: {stats.duplicates})")
+    if stats.latencies:
+        print(f"Задержка p50:        {percentile(stats.latencies, 0.50) * 1000:.1f} мс")
+        print(f"Задержка p99:        {percentile(stats.latencies, 0.99) * 1000:.1f} мс")
+        print(f"Задержка макс.:      {max(stats.latencies) * 1000:.1f} мс")
+    print(f"FloodWait:           {stats.flood_waits}")
+    if stats.outbox is not None:
+        print(f"Outbox:              повторов {stats.outbox.retries}, не отправлено {stats.outbox.depth}")
+    print()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота без сети")
+    parser.add_argument("--rate", type=float, nargs="+", default=[100.0],
+                        help="Частота сообщений, сообщ./с (несколько значений - несколько прогонов)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Длительность выдачи сообщений, с")
+    parser.add_argument("--channels", type=int, default=10, help="Число каналов")
+    parser.add_argument("--match-rate", type=float, default=0.01, help="Доля сообщений с совпадением")
+    parser.add_argument("--text-length", type=int, default=500, help="Длина сообщения")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--send-delay", type=float, default=0.0, help="Время отправки одного сообщения, с")
+    parser.add_argument("--telegram-limits", action="store_true",
+                        help="Ограничения скорости из config.py (RATE_LIMIT_*)")
+    parser.add_argument("--flood-rate", type=float, default=0.0,
+                        help="FloodWait при превышении N сообщений в секунду в один чат (0 - без FloodWait)")
+    parser.add_argument("--flood-burst", type=float, default=3.0, help="Сообщений подряд до FloodWait")
+    args = parser.parse_args()
+
+    # Метрики, перезагрузка конфига и дайджест в замер не входят
+    config.METRICS_PORT = 0
+    config.CONFIG_WATCH_INTERVAL = 0
+    config.DIGEST_MODE = False
+    logging.disable(logging.WARNING)
+
+    for rate in args.rate:
+        # Вывод бота (уведомления в консоль и т.п.) в замер не попадает
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            stats = run_load(rate, args)
+        print_report(rate, stats)
+
+
+if __name__ == "__main__":
+    main_cli()
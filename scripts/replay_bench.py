@@ -0,0 +1,244 @@
+"""
+Офлайн-бенчмарк обработки сообщений
+Прогоняет корпус сообщений через main.handler, check_keywords и отправку
+уведомлений с клиентом-заглушкой вместо TelegramClient (без сети)
+
+Корпус - JSONL, по одному сообщению на строку:
+    {"id": 1, "chat_id": -1001234567890, "text": "..."}
+(вместо "text" можно использовать поле "message", как в Message.to_dict() Telethon)
+
+Запуск:
+    python scripts/replay_bench.py --corpus messages.jsonl
+    python scripts/replay_bench.py --synthetic 1000000 --match-rate 0.01
+    python scripts/replay_bench.py --synthetic 100000 --queue --allocations
+    python scripts/replay_bench.py --synthetic 20000 --text-length 4000 --loop-lag --offload 2
+    python scripts/replay_bench.py --synthetic 1000000 --archive /tmp/archive.db
+"""
+
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import pathlib
+import random
+import sys
+import time
+import tracemalloc
+from array import array
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+import config  # noqa: E402
+import main  # noqa: E402
+from archive import MessageArchive  # noqa: E402
+from destinations import Router  # noqa: E402
+from entity_cache import NotifyTarget  # noqa: E402
+from notify_queue import NotificationQueue  # noqa: E402
+from offload import MatchPool  # noqa: E402
+
+ALPHABET = "абвгдеёжзийклмнопрстуфхцчшщъыьэюяієїґ"
+
+
+class StubChat:
+    """Информация о канале, которую вернул бы Telegram"""
+
+    def __init__(self, chat_id: int):
+        self.id = chat_id
+        self.title = f"Канал {chat_id}"
+        self.username = f"channel_{abs(chat_id)}"
+
+
+class StubMessage:
+    def __init__(self, message_id: int, text: str):
+        self.id = message_id
+        self.message = text
+        self.date = None
+
+
+class StubEvent:
+    """Событие с интерфейсом events.NewMessage.Event, используемым в handler"""
+
+    def __init__(self, chat_id: int, message_id: int, text: str):
+        self.chat_id = chat_id
+        self.message = StubMessage(message_id, text)
+
+    async def get_chat(self):
+        return StubChat(self.chat_id)
+
+
+class StubClient:
+    """Заглушка TelegramClient: запоминает отправленные сообщения"""
+
+    def __init__(self, send_delay: float = 0.0):
+        self.send_delay = send_delay
+        self.sent = 0
+        self.sent_chars = 0
+
+    async def get_input_entity(self, peer):
+        return peer
+
+    async def send_message(self, entity, text, parse_mode=None):
+        if self.send_delay:
+            await asyncio.sleep(self.send_delay)
+        self.sent += 1
+        self.sent_chars += len(text)
+
+
+def load_corpus(path: str):
+    """Читает сообщения из JSONL-файла"""
+    with open(path, encoding="utf-8") as f:
+        for index, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            data = json.loads(line)
+            text = data.get("text", data.get("message")) or ""
+            yield StubEvent(int(data.get("chat_id", -1000000000001)), int(data.get("id", index)), text)
+
+
+def synthetic_corpus(count: int, match_rate: float, length: int, channels: int, seed: int):
+    """Генерирует случайные сообщения; доля match_rate содержит ключевые слова"""
+    rng = random.Random(seed)
+    keywords = [k for k in config.KEYWORDS if k.strip()] or ["шлях"]
+    # Заранее готовим набор слов, чтобы генерация не искажала замер
+    vocabulary = ["".join(rng.choice(ALPHABET) for _ in range(rng.randint(2, 10))) for _ in range(5000)]
+    for index in range(1, count + 1):
+        words = rng.choices(vocabulary, k=max(1, length // 7))
+        if rng.random() < match_rate:
+            words.insert(rng.randrange(len(words)), rng.choice(keywords))
+        yield StubEvent(-1000000000000 - (index % channels), index, " ".join(words))
+
+
+def percentile(values: array, fraction: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def measure_loop_lag(samples: array, interval: float = 0.001):
+    """Записывает, насколько позже запланированного просыпается sleep (как metrics.monitor_loop)"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - started - interval))
+
+
+async def replay(events, use_queue: bool, send_delay: float, offload: int = 0,
+                 offload_min_length: int = 2000, loop_lag: array = None, archive_path: str = None):
+    client = StubClient(send_delay)
+    main.NOTIFY_CHAT_ID = "me"
+    main.notify_target = NotifyTarget("me")
+    # Ограничения скорости Telegram к заглушке клиента не относятся
+    main.notify_router = Router(main.notify_target, private_rate=1e9, group_rate=1e9, chats=main.rule_chats())
+    main.handler.bot_client = None
+
+    queue = None
+    if use_queue:
+        queue = NotificationQueue(main.deliver_alert, maxsize=config.NOTIFY_QUEUE_SIZE,
+                                  workers=config.NOTIFY_WORKERS, report_interval=0)
+        queue.start()
+    main.handler.queue = queue
+
+    pool = None
+    if offload:
+        pool = MatchPool([main.keyword_matcher], workers=offload, min_length=offload_min_length)
+        await pool.warm_up()
+    main.handler.match_pool = pool
+
+    archive = None
+    if archive_path:
+        archive = MessageArchive(archive_path, batch_size=config.ARCHIVE_BATCH_SIZE)
+        archive.open()
+    main.handler.archive = archive
+
+    probe = None
+    if loop_lag is not None:
+        probe = asyncio.create_task(measure_loop_lag(loop_lag))
+
+    latencies = array("d")
+    count = 0
+    started = time.perf_counter()
+    for event in events:
+        t0 = time.perf_counter()
+        await main.handler(event, "replay", client)
+        latencies.append(time.perf_counter() - t0)
+        count += 1
+        if probe is not None:
+            # Между обновлениями клиент читает сеть - даем event loop выполнить другие задачи
+            await asyncio.sleep(0)
+    if queue is not None:
+        await queue.stop()
+        main.handler.queue = None
+    if archive is not None:
+        # Время записи архива на диск входит в замер
+        main.handler.archive = None
+        await archive.close()
+    elapsed = time.perf_counter() - started
+    if probe is not None:
+        probe.cancel()
+    if pool is not None:
+        main.handler.match_pool = None
+        pool.close(wait=True)
+    return count, elapsed, latencies, client
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк обработки сообщений")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--corpus", help="JSONL-файл с сообщениями")
+    source.add_argument("--synthetic", type=int, help="Количество случайных сообщений")
+    parser.add_argument("--match-rate", type=float, default=0.01, help="Доля сообщений с совпадением")
+    parser.add_argument("--text-length", type=int, default=500, help="Длина случайного сообщения")
+    parser.add_argument("--channels", type=int, default=10, help="Число каналов в случайном корпусе")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--queue", action="store_true", help="Отправлять через очередь уведомлений")
+    parser.add_argument("--send-delay", type=float, default=0.0, help="Задержка send_message заглушки, с")
+    parser.add_argument("--allocations", action="store_true", help="Считать выделения памяти (tracemalloc)")
+    parser.add_argument("--limit", type=int, help="Обработать не больше N сообщений корпуса")
+    parser.add_argument("--offload", type=int, default=0, help="Проверять длинные сообщения в пуле из N процессов")
+    parser.add_argument("--offload-min-length", type=int, default=2000, help="Порог длины для пула процессов")
+    parser.add_argument("--loop-lag", action="store_true", help="Измерять задержку event loop")
+    parser.add_argument("--archive", help="Записывать сообщения в архив (файл SQLite)")
+    args = parser.parse_args()
+
+    if args.corpus:
+        events = load_corpus(args.corpus)
+    else:
+        events = synthetic_corpus(args.synthetic, args.match_rate, args.text_length, args.channels, args.seed)
+    if args.limit:
+        events = itertools.islice(events, args.limit)
+
+    if args.allocations:
+        tracemalloc.start()
+
+    # Вывод обработчика (уведомления в консоль и т.п.) в замер не попадает
+    loop_lag = array("d") if args.loop_lag else None
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        count, elapsed, latencies, client = asyncio.run(replay(
+            events, args.queue, args.send_delay, args.offload, args.offload_min_length, loop_lag,
+            args.archive
+        ))
+
+    print(f"Сообщений:         {count}")
+    print(f"Время:             {elapsed:.2f} с")
+    print(f"Пропускная спос.:  {count / elapsed if elapsed else 0:.0f} сообщ./с")
+    print(f"Задержка p50:      {percentile(latencies, 0.50) * 1e6:.1f} мкс")
+    print(f"Задержка p99:      {percentile(latencies, 0.99) * 1e6:.1f} мкс")
+    print(f"Задержка макс.:    {max(latencies, default=0) * 1e6:.1f} мкс")
+    print(f"Отправлено:        {client.sent} сообщений ({client.sent_chars} символов)")
+    if loop_lag is not None:
+        print(f"Задержка loop p99: {percentile(loop_lag, 0.99) * 1e6:.1f} мкс")
+        print(f"Задержка loop макс.: {max(loop_lag, default=0) * 1e6:.1f} мкс")
+    if args.allocations:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"Память:            текущая {current / 1024:.0f} КБ, пик {peak / 1024:.0f} КБ")
+        print(f"На сообщение:      {peak / max(count, 1):.0f} байт (пик)")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -10,7 +10,7 @@ echo ""
 if [ "$1" == "matches" ] || [ "$1" == "m" ]; then
     echo "🔍 Показываю только перехваченные сообщения (совпадения):"
     echo ""
-    sudo journalctl -u telegram-monitor.service -f | grep -A 10 "НАЙДЕНО СОВПАДЕНИЕ"
+    sudo journalctl -u telegram-monitor.service -f | grep --line-buffered "Найдено совпадение"
 elif [ "$1" == "all" ] || [ "$1" == "a" ]; then
     echo "📜 Показываю все логи (последние 100 строк):"
     echo ""
@@ -22,7 +22,7 @@ elif [ "$1" == "follow" ] || [ "$1" == "f" ]; then
 elif [ "$1" == "errors" ] || [ "$1" == "e" ]; then
     echo "❌ Показываю только ошибки:"
     echo ""
-    sudo journalctl -u telegram-monitor.service -n 50 | grep -i "ошибка\|error\|failed\|exception"
+    sudo journalctl -u telegram-monitor.service -n 50 | grep -i '"level": "\(warning\|error\)"\|ошибка\|exception'
 else
     echo "Использование: bash view_logs.sh [опция]"
     echo ""
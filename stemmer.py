@@ -0,0 +1,36 @@
+"""
+Упрощенный стеммер для русского и украинского языков
+Отбрасывает падежные окончания существительных и прилагательных, чтобы
+разные формы слова ("шлях", "шляху", "шляхом", "шляхів") сводились к одной основе
+Это не полноценный морфологический анализ: чередования в корне ("Київ" / "Києва")
+не учитываются, но для поиска по ключевым словам этого достаточно
+"""
+
+from functools import lru_cache
+
+# Основа короче этого числа букв не укорачивается ("мир", "ряд" остаются как есть)
+MIN_STEM = 3
+
+# Окончания в нормализованной форме (нижний регистр, ё -> е, см. normalize.py)
+ENDINGS = frozenset("""
+    иями
+    ами ями ого его ому ему ыми ими іми ові еві єві ием иям иях ией
+    ах ях ам ям ов ев ей ой ий ый ій ая яя ое ее ые ие ую юю ых их ім іх ым им
+    ом ем ою ею єю ів їв ої ія ие ию ья ью ьи
+    а я о е ы и і ї у ю ь й є
+""".split())
+
+_MAX_ENDING = max(len(ending) for ending in ENDINGS)
+
+
+@lru_cache(maxsize=65536)
+def stem(word: str) -> str:
+    """
+    Основа слова: отбрасывается самое длинное окончание из ENDINGS,
+    после которого остается не меньше MIN_STEM букв
+    Результат кэшируется - частые слова сообщений разбираются один раз
+    """
+    for size in range(min(_MAX_ENDING, len(word) - MIN_STEM), 0, -1):
+        if word[-size:] in ENDINGS:
+            return word[:-size]
+    return word
@@ -0,0 +1,401 @@
+"""
+Режим нескольких процессов для большого числа каналов
+Каналы распределяются между N процессами-воркерами, у каждого свой клиент
+и свой файл сессии (поэтому ошибка "database is locked" невозможна).
+Воркеры получают сообщения и ищут ключевые слова, а найденные совпадения
+передают через multiprocessing.Queue одному процессу-уведомителю
+(этому процессу), который отсеивает повторы и отправляет уведомления
+
+Запуск:
+    python supervisor.py --login --workers 4   # один раз: авторизация сессий воркеров
+    python supervisor.py --workers 4
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import pathlib
+import queue as queue_module
+import signal
+import sys
+import time
+
+from telethon import TelegramClient
+
+import config
+import main
+import metrics
+from backfill import MessageState
+from channels import RouteTable, build_routes, load_channels
+from dedup import DedupStore, message_fingerprints
+from digest import DigestBuffer
+from entity_cache import ChannelCache
+from log import get_logger, setup_logging
+from notify_queue import Alert, AlertMessage, NotificationQueue
+from reconnect import run_until_stopped
+from updates import EditTracker
+
+log = get_logger("supervisor")
+
+# Код выхода воркера, сессия которого не авторизована (перезапуск не поможет)
+EXIT_UNAUTHORIZED = 3
+
+
+def shard_channels(channels: dict, workers: int) -> list:
+    """
+    Распределяет каналы между воркерами по кругу в порядке имен
+    Возвращает список словарей (имя канала -> ключевые слова), по одному на воркер
+    """
+    shards = [{} for _ in range(max(1, workers))]
+    for position, name in enumerate(sorted(channels)):
+        shards[position % len(shards)][name] = channels[name]
+    return [shard for shard in shards if shard]
+
+
+def worker_session_path(index: int) -> pathlib.Path:
+    return pathlib.Path(f'telegram_monitor.worker{index}.session').absolute()
+
+
+def setup_process_logging(worker: int = None):
+    setup_logging(
+        level=config.LOG_LEVEL,
+        fmt=config.LOG_FORMAT,
+        burst=config.LOG_RATE_LIMIT,
+        interval=config.LOG_RATE_INTERVAL,
+        fields={"worker": worker} if worker is not None else None
+    )
+
+
+# --- Процесс-воркер ---
+
+async def run_worker(index: int, channels: dict, ipc_queue) -> int:
+    """
+    Мониторинг части каналов: тот же обработчик, что и в main.py, но найденные
+    совпадения передаются уведомителю через ipc_queue
+    """
+    client = TelegramClient(str(worker_session_path(index)), main.API_ID, main.API_HASH)
+    await client.connect()
+    if not await client.is_user_authorized():
+        log.error("Сессия воркера не авторизована, выполните: python supervisor.py --login",
+                  extra={"session": str(worker_session_path(index))})
+        await client.disconnect()
+        return EXIT_UNAUTHORIZED
+
+    loop = asyncio.get_running_loop()
+    # Супервизор останавливает воркер сигналом SIGTERM
+    loop.add_signal_handler(signal.SIGTERM, lambda: asyncio.ensure_future(client.disconnect()))
+
+    channel_cache = ChannelCache(pathlib.Path(f'entity_cache.worker{index}.json').absolute())
+    channel_cache.load()
+    peer_ids = await main.resolve_channels(client, channels, cache=channel_cache)
+    if not peer_ids:
+        log.error("Не удалось получить ни один канал воркера")
+        await client.disconnect()
+        return 1
+    channel_cache.save()
+    routes = RouteTable(build_routes(peer_ids, channels, main.keyword_matcher))
+
+    message_state = MessageState(pathlib.Path(f'monitor_state.worker{index}.json').absolute())
+    message_state.load()
+    if config.BACKFILL_ENABLED:
+        message_state.mark_gaps()
+    main.handler.edits = EditTracker(config.EDIT_TRACK_MAX)
+    # Воркеры пишут в общий архив (SQLite в режиме WAL)
+    archive = main.start_archive() if config.ARCHIVE_ENABLED else None
+
+    async def forward_alert(alert: Alert):
+        # Название канала и ссылка определяются здесь - у уведомителя нет entity каналов
+        alert_message = await main.describe_alert(alert)
+        if alert.normalized is not None:
+            # Повторы отсеивает уведомитель: он видит совпадения всех воркеров.
+            # Уведомления одного сообщения по правилам с разными чатами (alert.chat)
+            # приходят отдельно, поэтому отпечатки у каждого чата свои
+            alert_message = alert_message._replace(
+                fingerprints=message_fingerprints(alert.event, alert.normalized.text, alert.chat)
+            )
+        try:
+            ipc_queue.put_nowait(alert_message)
+        except queue_module.Full:
+            # Уведомитель не успевает - ждем места, не блокируя event loop
+            await loop.run_in_executor(None, ipc_queue.put, alert_message)
+
+    queue = NotificationQueue(forward_alert, maxsize=config.NOTIFY_QUEUE_SIZE, workers=config.NOTIFY_WORKERS)
+    queue.start()
+    main.handler.queue = queue
+    metrics.NOTIFY_QUEUE_DEPTH.function = lambda: queue.depth
+
+    event_handlers = main.make_event_handlers(client, routes, message_state)
+    main.subscribe(client, event_handlers, routes)
+    log.info("Ожидание новых сообщений", extra={"channels": len(routes)})
+
+    background_tasks = [
+        asyncio.create_task(main.recheck_channels(client, routes, event_handlers, channel_cache)),
+        asyncio.create_task(message_state.autosave()),
+    ]
+    if archive is not None:
+        background_tasks.append(asyncio.create_task(archive.autoflush()))
+    metrics_server = None
+    if config.METRICS_PORT:
+        # Каждый воркер отдает метрики на своем порту: METRICS_PORT + 1 + номер
+        port = config.METRICS_PORT + 1 + index
+        try:
+            metrics_server = await metrics.start_server(config.METRICS_HOST, port)
+        except OSError as e:
+            log.warning("Не удалось запустить сервер метрик", extra={"port": port, "error": str(e)})
+        background_tasks.append(asyncio.create_task(metrics.monitor_loop(client)))
+    if config.BACKFILL_ENABLED:
+        background_tasks.append(main.start_backfill(client, routes, message_state))
+
+    def on_disconnect():
+        # Начало догрузки - до переподключения (см. main.main)
+        message_state.reset_live()
+        if config.BACKFILL_ENABLED:
+            message_state.mark_gaps()
+
+    async def on_reconnect():
+        if config.BACKFILL_ENABLED:
+            main.restart_backfill(background_tasks, client, routes, message_state)
+
+    try:
+        # Обрыв соединения не останавливает воркер: он переподключается сам и догружает пропущенное
+        await run_until_stopped(client, f"worker{index}", on_disconnect=on_disconnect,
+                                on_reconnect=on_reconnect, initial_delay=config.RECONNECT_INITIAL_DELAY,
+                                max_delay=config.RECONNECT_MAX_DELAY)
+    finally:
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        if metrics_server is not None:
+            metrics_server.close()
+        main.handler.queue = None
+        await queue.stop()
+        message_state.save()
+        if archive is not None:
+            main.handler.archive = None
+            await archive.close()
+    return 0
+
+
+def worker_process(index: int, channels: dict, ipc_queue):
+    """Точка входа процесса-воркера"""
+    # Ctrl+C в терминале получает вся группа процессов - останавливает воркеры супервизор
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    setup_process_logging(worker=index)
+    sys.exit(asyncio.run(run_worker(index, channels, ipc_queue)))
+
+
+# --- Супервизор и уведомитель ---
+
+class WorkerHandle:
+    """Процесс-воркер и его каналы"""
+
+    def __init__(self, index: int, channels: dict):
+        self.index = index
+        self.channels = channels
+        self.process = None
+        self.restart_at = 0.0
+        self.disabled = False
+
+    def start(self, context, ipc_queue):
+        self.process = context.Process(
+            target=worker_process,
+            args=(self.index, self.channels, ipc_queue),
+            name=f"monitor-worker-{self.index}",
+            daemon=True
+        )
+        self.process.start()
+        log.info("Воркер запущен", extra={"worker": self.index, "pid": self.process.pid,
+                                           "channels": len(self.channels)})
+
+
+async def supervise(handles: list, context, ipc_queue, stop: asyncio.Event):
+    """Перезапускает упавшие воркеры (не чаще раза в WORKER_RESTART_DELAY секунд)"""
+    while not stop.is_set():
+        now = time.monotonic()
+        for handle in handles:
+            process = handle.process
+            if handle.disabled or process is None or process.is_alive():
+                continue
+            if process.exitcode == EXIT_UNAUTHORIZED:
+                handle.disabled = True
+                log.error("Воркер остановлен: сессия не авторизована", extra={"worker": handle.index})
+                continue
+            if not handle.restart_at:
+                handle.restart_at = now + config.WORKER_RESTART_DELAY
+                log.warning("Воркер завершился, будет перезапущен",
+                            extra={"worker": handle.index, "exitcode": process.exitcode,
+                                   "delay": config.WORKER_RESTART_DELAY})
+            elif now >= handle.restart_at:
+                handle.restart_at = 0.0
+                handle.start(context, ipc_queue)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=1)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def stop_workers(handles: list, timeout: float = 10.0):
+    """Останавливает воркеры: SIGTERM, а если не завершились за timeout - SIGKILL"""
+    loop = asyncio.get_running_loop()
+    processes = [handle.process for handle in handles if handle.process is not None]
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    deadline = time.monotonic() + timeout
+    for process in processes:
+        await loop.run_in_executor(None, process.join, max(0.0, deadline - time.monotonic()))
+        if process.is_alive():
+            process.kill()
+            await loop.run_in_executor(None, process.join)
+
+
+async def receive_alerts(ipc_queue, queue: NotificationQueue):
+    """Передает совпадения от воркеров в очередь уведомлений (до None)"""
+    loop = asyncio.get_running_loop()
+    while True:
+        alert_message = await loop.run_in_executor(None, ipc_queue.get)
+        if alert_message is None:
+            return
+        await queue.put(alert_message)
+
+
+async def start_notifier_client():
+    """
+    Клиент для отправки уведомлений: бот (BOT_TOKEN) или основной аккаунт
+    с сессией telegram_monitor.session, которую воркеры не используют
+    """
+    if main.BOT_TOKEN:
+        bot_client = TelegramClient(str(pathlib.Path('telegram_bot.session').absolute()),
+                                    main.API_ID, main.API_HASH)
+        await bot_client.start(bot_token=main.BOT_TOKEN)
+        main.handler.bot_client = bot_client
+        log.info("Бот подключен для отправки уведомлений")
+        return bot_client
+    client = TelegramClient(str(pathlib.Path('telegram_monitor.session').absolute()),
+                            main.API_ID, main.API_HASH)
+    await client.start()
+    return client
+
+
+async def run_supervisor(workers: int):
+    if not main.API_ID or not main.API_HASH:
+        log.error("Не указаны API_ID и/или API_HASH в .env файле")
+        return
+    channels = load_channels(main.CHANNEL_NAME)
+    if not channels:
+        log.error("Не указан CHANNEL_NAME в .env файле или CHANNELS в config.py")
+        return
+    shards = shard_channels(channels, workers)
+    log.info("Запуск в режиме нескольких процессов",
+             extra={"workers": len(shards), "channels": len(channels)})
+
+    # Без получателей (NOTIFY_CHAT_ID, DESTINATIONS, чаты правил) уведомления пишутся
+    # только в лог и клиент не нужен
+    client = None
+    if len(main.notify_router):
+        client = await start_notifier_client()
+        if main.notify_target is not None:
+            await main.notify_target.resolve(client)
+
+    dedup = None
+    if config.DEDUP_ENABLED:
+        dedup = DedupStore(pathlib.Path('dedup_state.bin').absolute(),
+                           max_entries=config.DEDUP_MAX_ENTRIES, ttl=config.DEDUP_TTL)
+        dedup.load()
+
+    digest = None
+    if config.DIGEST_MODE and main.NOTIFY_CHAT_ID:
+        async def send_digest(text):
+            await main.send_notification(client, text, getattr(main.handler, 'bot_client', None))
+
+        digest = DigestBuffer(send_digest, window=config.DIGEST_WINDOW, max_alerts=config.DIGEST_MAX_ALERTS)
+        main.handler.digest = digest
+
+    async def notify(alert_message: AlertMessage):
+        # Правка без известной предыдущей версии (после перезапуска воркера или старого
+        # сообщения) проверяется по отпечаткам, как в main.process_message
+        if (dedup is not None and dedup.check_and_add(alert_message.fingerprints)
+                and not alert_message.tracked_edit):
+            metrics.DUPLICATES_DROPPED.inc(alert_message.channel_name)
+            return
+        await main.notify_alert(alert_message, client)
+
+    queue = NotificationQueue(notify, maxsize=config.NOTIFY_QUEUE_SIZE, workers=config.NOTIFY_WORKERS,
+                              on_drain=digest.flush if digest else None,
+                              on_idle=digest.flush if digest and config.DIGEST_FLUSH_ON_IDLE else None)
+    queue.start()
+    metrics.NOTIFY_QUEUE_DEPTH.function = lambda: queue.depth
+    outbox = main.start_outbox(client) if config.OUTBOX_ENABLED and client is not None else None
+
+    context = multiprocessing.get_context("spawn")
+    ipc_queue = context.Queue(maxsize=config.NOTIFY_QUEUE_SIZE)
+    handles = [WorkerHandle(index, shard) for index, shard in enumerate(shards)]
+    for handle in handles:
+        handle.start(context, ipc_queue)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    # systemctl reload: перезагрузка конфигурации в этом режиме не поддерживается
+    loop.add_signal_handler(signal.SIGHUP, lambda: log.warning(
+        "Перезагрузка конфигурации в режиме нескольких процессов не поддерживается, перезапустите сервис"))
+
+    background_tasks = []
+    if dedup is not None:
+        background_tasks.append(asyncio.create_task(dedup.autosave()))
+    metrics_server = None
+    if config.METRICS_PORT:
+        try:
+            metrics_server = await metrics.start_server(config.METRICS_HOST, config.METRICS_PORT)
+        except OSError as e:
+            log.warning("Не удалось запустить сервер метрик", extra={"port": config.METRICS_PORT, "error": str(e)})
+    receiver = asyncio.create_task(receive_alerts(ipc_queue, queue))
+
+    try:
+        await supervise(handles, context, ipc_queue, stop)
+    finally:
+        log.info("Остановка воркеров")
+        await stop_workers(handles)
+        # Воркеры остановлены - дочитываем их совпадения и останавливаем прием
+        ipc_queue.put(None)
+        await receiver
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        if metrics_server is not None:
+            metrics_server.close()
+        await queue.stop()
+        if outbox is not None:
+            await outbox.stop()
+        if dedup is not None:
+            dedup.save()
+        if client is not None:
+            await client.disconnect()
+
+
+async def login_workers(workers: int):
+    """Интерактивная авторизация сессий воркеров (телефон и код подтверждения)"""
+    for index in range(workers):
+        client = TelegramClient(str(worker_session_path(index)), main.API_ID, main.API_HASH)
+        await client.start()
+        me = await client.get_me()
+        log.info("Сессия воркера авторизована", extra={"worker": index, "user_id": me.id})
+        await client.disconnect()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Мониторинг каналов несколькими процессами")
+    parser.add_argument("--workers", type=int, default=config.SHARD_WORKERS, help="Число процессов-воркеров")
+    parser.add_argument("--login", action="store_true", help="Авторизовать сессии воркеров и выйти")
+    args = parser.parse_args()
+
+    setup_process_logging()
+    if args.login:
+        asyncio.run(login_workers(max(1, args.workers)))
+    else:
+        asyncio.run(run_supervisor(max(1, args.workers)))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,37 @@
+"""
+Нормализация текста и поиск ключевых слов без учета регистра
+Запуск: python -m pytest tests
+"""
+
+import pathlib
+import sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from matcher import KeywordMatcher  # noqa: E402
+from normalize import Normalizer  # noqa: E402
+
+
+def test_latin_case_folds_to_same_form():
+    # У B, H, T кириллический двойник есть только у заглавной буквы
+    normalizer = Normalizer()
+    assert normalizer.fold("Bitcoin") == normalizer.fold("bitcoin") == normalizer.fold("BITCOIN")
+    assert normalizer.fold("THE Hotel") == normalizer.fold("the hotel")
+
+
+def test_mixed_case_latin_keywords_match():
+    matcher = KeywordMatcher(["bitcoin", "taxi"], normalizer=Normalizer())
+    assert matcher.match("Bitcoin news, Taxi here") == ["bitcoin", "taxi"]
+    assert matcher.match("BITCOIN, TAXI") == ["bitcoin", "taxi"]
+
+
+def test_latin_lookalikes_match_cyrillic_keyword():
+    matcher = KeywordMatcher(["ремонт"], normalizer=Normalizer())
+    # "pemoнт": латинские p, e, o вместо кириллических
+    assert matcher.match("Дорожный pemoнт") == ["ремонт"]
+    assert matcher.match("РЕМОНТ дороги") == ["ремонт"]
+
+
+def test_match_fragment_keeps_original_spelling():
+    normalized = Normalizer().normalize("Курс Bitcoin вырос")
+    assert normalized.find_original("bitcoin") == "Bitcoin"
@@ -0,0 +1,143 @@
+"""
+Журнал исходящих уведомлений (outbox.py)
+Запуск: python -m pytest tests
+"""
+
+import asyncio
+import json
+import pathlib
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from telethon import errors  # noqa: E402
+
+from outbox import Outbox, UndeliverableError  # noqa: E402
+
+
+class FakeSend:
+    """send(entry) для Outbox: записывает отправленное, ошибки берет из очереди errors"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.sent = []
+
+    async def __call__(self, entry):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append((entry.chat, entry.text, entry.random_id))
+
+
+def records(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+async def run_outbox(outbox, seconds=0.05):
+    outbox.start()
+    await asyncio.sleep(seconds)
+    await outbox.stop(timeout=0)
+
+
+def test_reload_after_torn_last_line(tmp_path):
+    path = tmp_path / "outbox.log"
+    now = time.time()
+    path.write_text(
+        json.dumps({"op": "add", "id": 1, "chat": None, "text": "a", "random_id": 11, "created": now}) + "\n"
+        + json.dumps({"op": "add", "id": 2, "chat": "ops", "text": "b", "random_id": 22, "created": now}) + "\n"
+        + json.dumps({"op": "sent", "id": 1}) + "\n"
+        + '{"op": "add", "id": 3, "chat": null, "te',
+        encoding="utf-8"
+    )
+    outbox = Outbox(path, FakeSend())
+    outbox.load()
+    assert len(outbox) == 1
+    # Журнал сжат: осталось только неотправленное уведомление
+    assert [(r["op"], r["id"], r["random_id"]) for r in records(path)] == [("add", 2, 22)]
+    outbox.add(None, "c")
+    assert outbox.add(None, "d").id == 4
+
+
+def test_unsent_entries_survive_restart_with_same_random_id(tmp_path):
+    path = tmp_path / "outbox.log"
+    first = Outbox(path, FakeSend())
+    first.load()
+    entry = first.add("ops", "текст")
+    asyncio.run(first.stop())
+
+    send = FakeSend()
+    second = Outbox(path, send)
+    second.load()
+    asyncio.run(run_outbox(second))
+    assert send.sent == [("ops", "текст", entry.random_id)]
+    assert len(second) == 0
+
+
+def test_compaction_keeps_only_pending(tmp_path):
+    path = tmp_path / "outbox.log"
+    send = FakeSend()
+    outbox = Outbox(path, send, compact_after=3)
+    outbox.load()
+
+    async def scenario():
+        outbox.start()
+        for index in range(3):
+            outbox.add(None, f"m{index}")
+        await asyncio.sleep(0.05)
+        # Четвертое остается неотправленным: первая попытка ждет повтора
+        send.errors.append(ConnectionError("нет сети"))
+        outbox.add(None, "m3")
+        await asyncio.sleep(0.05)
+        await outbox.stop(timeout=0)
+
+    asyncio.run(scenario())
+    assert [text for _, text, _ in send.sent] == ["m0", "m1", "m2"]
+    assert [(r["op"], r["text"]) for r in records(path)] == [("add", "m3")]
+
+
+def test_random_id_duplicate_counts_as_sent(tmp_path):
+    path = tmp_path / "outbox.log"
+    outbox = Outbox(path, FakeSend(errors.RandomIdDuplicateError(request=None)))
+    outbox.load()
+    outbox.add(None, "a")
+    asyncio.run(run_outbox(outbox))
+    assert len(outbox) == 0
+    assert outbox.sent == 1 and outbox.retries == 0
+    assert records(path)[-1]["op"] == "sent"
+
+
+def test_flood_wait_reschedules_without_dropping(tmp_path):
+    path = tmp_path / "outbox.log"
+    send = FakeSend(errors.FloodWaitError(request=None, capture=30))
+    outbox = Outbox(path, send)
+    outbox.load()
+    entry = outbox.add(None, "a")
+    second = outbox.add(None, "b")
+    started = time.monotonic()
+    asyncio.run(run_outbox(outbox))
+    assert outbox.retries == 1 and outbox.dropped == 0
+    assert entry.next_attempt >= started + 30
+    # Уведомления одного получателя идут по порядку: второе ждет вместе с первым
+    assert send.sent == [] and len(outbox) == 2 and second.attempts == 0
+
+
+def test_undeliverable_entry_is_dropped(tmp_path):
+    path = tmp_path / "outbox.log"
+    send = FakeSend(UndeliverableError("получатель не настроен"))
+    outbox = Outbox(path, send)
+    outbox.load()
+    outbox.add("gone", "a")
+    outbox.add("gone", "b")
+    asyncio.run(run_outbox(outbox))
+    assert outbox.dropped == 1 and len(outbox) == 0
+    assert [text for _, text, _ in send.sent] == ["b"]
+    assert [r["op"] for r in records(path)][-2:] == ["drop", "sent"]
+
+    reloaded = Outbox(path, FakeSend())
+    reloaded.load()
+    assert len(reloaded) == 0
+
+
+def test_backoff_does_not_overflow(tmp_path):
+    outbox = Outbox(tmp_path / "outbox.log", FakeSend(), max_backoff=300)
+    assert outbox._backoff(5000) <= 300
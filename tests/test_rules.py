@@ -0,0 +1,35 @@
+"""
+Правила поиска (rules.py)
+Запуск: python -m pytest tests
+"""
+
+import pathlib
+import sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from matcher import KeywordMatcher  # noqa: E402
+from normalize import Normalizer  # noqa: E402
+from rules import RuleSet  # noqa: E402
+
+
+def compile_phrases(phrases):
+    return KeywordMatcher(phrases, normalizer=Normalizer())
+
+
+def test_latin_regex_matches_original_text():
+    rules = RuleSet([], [{"name": "btc", "rule": "/bitcoin|btc/i"}], compile_phrases)
+    assert rules.match("bitcoin up") == ["btc"]
+    assert rules.match("BTC down") == ["btc"]
+
+
+def test_regex_case_sensitive_without_flag():
+    rules = RuleSet([], [{"name": "btc", "rule": "/BTC/"}], compile_phrases)
+    assert rules.match("BTC down") == ["btc"]
+    assert rules.match("btc down") == []
+
+
+def test_phrases_and_regex_together():
+    rules = RuleSet([], [{"name": "м-05", "rule": r"шлях AND /траса\s+м-?0?5/i NOT реклама"}], compile_phrases)
+    assert rules.match("Шлях закрито: Траса М-05") == ["м-05"]
+    assert rules.match("Шлях закрито: Траса М-05, реклама") == []
@@ -0,0 +1,81 @@
+"""
+Альбомы и отредактированные сообщения
+Части альбома (несколько фото/видео с одним grouped_id) объединяются в одно
+сообщение, а для отредактированных сообщений запоминается, какой текст и какие
+ключевые слова были у предыдущей версии, чтобы не уведомлять повторно
+"""
+
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional, Tuple
+
+
+def album_text(messages) -> str:
+    """Текст альбома: подписи всех его частей (обычно подпись есть только у одной)"""
+    captions = []
+    for message in messages:
+        caption = (message.message or "").strip()
+        if caption and caption not in captions:
+            captions.append(caption)
+    return "\n\n".join(captions)
+
+
+class AlbumMessage:
+    """
+    Альбом как одно сообщение: ID и атрибуты части с подписью, текст - все подписи
+    Остальные атрибуты берутся у исходного сообщения
+    """
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self._main = next((m for m in self.messages if m.message), self.messages[0])
+        self.message = album_text(self.messages)
+        self.last_id = max(m.id for m in self.messages)
+
+    def __getattr__(self, name):
+        return getattr(self._main, name)
+
+
+class AlbumEvent:
+    """
+    Обертка над events.Album.Event с тем же интерфейсом, что и у
+    события NewMessage, для передачи в обработчик
+    """
+
+    def __init__(self, event):
+        self.event = event
+        self.message = AlbumMessage(event.messages)
+        self.chat_id = event.chat_id
+
+    async def get_chat(self):
+        return await self.event.get_chat()
+
+
+class MessageVersion(NamedTuple):
+    """Предыдущая версия сообщения"""
+    text_hash: int        # hash() нормализованного текста
+    keywords: Tuple[str, ...]
+
+
+class EditTracker:
+    """
+    Последние версии недавних сообщений: (chat_id, message_id) -> MessageVersion
+    Хранится не больше max_entries сообщений, самые давние вытесняются
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max(1, max_entries)
+        self._versions: "OrderedDict[Tuple[int, int], MessageVersion]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._versions)
+
+    def get(self, chat_id: int, message_id: int) -> Optional[MessageVersion]:
+        return self._versions.get((chat_id, message_id))
+
+    def remember(self, chat_id: int, message_id: int, text: str, keywords: List[str]):
+        """Запоминает текущую версию сообщения"""
+        key = (chat_id, message_id)
+        self._versions.pop(key, None)
+        self._versions[key] = MessageVersion(hash(text), tuple(keywords))
+        if len(self._versions) > self.max_entries:
+            self._versions.popitem(last=False)